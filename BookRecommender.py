@@ -1,312 +1,476 @@
+import time
+_started = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
-from difflib import SequenceMatcher
-import plotly.express as px
-from datetime import datetime
-import seaborn as sns
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud, STOPWORDS
-
-st.set_page_config(
-    page_title="NextBook — рекомендательная система",
-    page_icon="📚",
-    layout="wide"
-)
-
-# Новый стиль
-st.markdown("""
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700&family=Open+Sans:wght@400;600&display=swap');
-
-        .main {
-            padding: 2rem;
-            font-family: 'Open Sans', sans-serif;
-        }
-        h1, h2, h3, h4, h5 {
-            font-family: 'Roboto', sans-serif;
-            color: #4A4A4A;
-        }
+from live_catalog import LiveCatalog
+from hybrid import DEFAULT_WEIGHTS
+from typeahead import build_search_indexes
+from instrumentation import serve_metrics, span, start_trace, write_metrics
+import os
+import json
+from html import escape
+from caching import DiskCache
+
+# С такого размера каталога поиск по названиям переключается на приближённый (IVF)
+ANN_MIN_ROWS = 1_000_000
+# Сколько подсказок показывать под полем поиска
+TYPEAHEAD_LIMIT = 10
+# Карточки выводятся страницами по PAGE_SIZE, всего не больше MAX_RECOMMENDATIONS
+PAGE_SIZE = 20
+MAX_RECOMMENDATIONS = 500
+# Дисковый кэш готовых графиков (NEXTBOOK_FIGURE_CACHE переопределяет каталог)
+FIGURE_CACHE_DIR = ".cache/figures"
+FIGURE_CACHE_BYTES = 128 << 20
+
+HYBRID_LABELS = {
+    'title': "Название",
+    'author': "Автор",
+    'publisher': "Издатель",
+    'language': "Язык",
+    'pages': "Объём",
+    'popularity': "Популярность",
+}
+
+
+def setup_page():
+    # Вызывается из main(), чтобы модуль импортировался без побочных эффектов
+    st.set_page_config(
+        page_title="NextBook — рекомендательная система",
+        page_icon="📚",
+        layout="wide"
+    )
+
+    # Новый стиль
+    st.markdown("""
+        <style>
+            @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700&family=Open+Sans:wght@400;600&display=swap');
+
+            .main {
+                padding: 2rem;
+                font-family: 'Open Sans', sans-serif;
+            }
+            h1, h2, h3, h4, h5 {
+                font-family: 'Roboto', sans-serif;
+                color: #4A4A4A;
+            }
+
+            .stButton>button {
+                width: 100%;
+                background: linear-gradient(90deg, #6C63FF, #A084DC);
+                color: white;
+                border: none;
+                padding: 0.6rem;
+                border-radius: 0.5rem;
+                font-weight: bold;
+                transition: background 0.3s ease, transform 0.3s ease;
+            }
+            .stButton>button:hover {
+                background: linear-gradient(90deg, #4C47E3, #6F5BB5);
+                transform: scale(1.05);
+                color: white;
+            }
+            .recommendation-card {
+                padding: 1.5rem;
+                border-radius: 1rem;
+                background: linear-gradient(135deg, #F0F0F5, #D9D9E4);
+                margin: 1rem 0;
+                border-left: 5px solid #6C63FF;
+                box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+                color: #333333;
+                transition: transform 0.3s ease, box-shadow 0.3s ease;
+            }
+            .recommendation-card:hover {
+                transform: translateY(-5px);
+                box-shadow: 0 8px 16px rgba(0,0,0,0.15);
+            }
+            .metric-row {
+                display: grid;
+                grid-template-columns: repeat(3, 1fr);
+                gap: 1rem;
+                margin-top: 1rem;
+            }
+            .metric-card {
+                background-color: #ffffff;
+                padding: 1rem;
+                border-radius: 0.8rem;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+                color: black;
+                transition: transform 0.3s ease, box-shadow 0.3s ease;
+            }
+            .metric-card:hover {
+                transform: translateY(-5px);
+                box-shadow: 0 6px 12px rgba(0,0,0,0.15);
+            }
+            </style>
+        """, unsafe_allow_html=True)
+
+
+# Каталог общий для всех сессий: собирается один раз, дальше правится на месте
+# (дописанные в CSV строки, фоновое сжатие). Кэши ниже ключуются его версией
+@st.cache_resource
+def get_catalog():
+    with span("load_catalog"):
+        # NEXTBOOK_SHARED_CATALOG — имя каталога из `python shared.py publish`;
+        # несколько процессов Streamlit тогда делят одну копию данных и индексов
+        catalog = LiveCatalog("books.csv", ann_min_rows=ANN_MIN_ROWS, shared=os.environ.get("NEXTBOOK_SHARED_CATALOG"))
+    return catalog.start()
+
+
+def dataset_version():
+    return get_catalog().version
+
+
+def get_recommender():
+    return get_catalog().recommender
+
+
+# cache_resource, а не cache_data: кадр над памятью каталога (mmap / shared memory)
+# не сериализуется в копию на каждый процесс и не копируется при каждом обращении.
+# Вызывающий код кадр не меняет
+@st.cache_resource(max_entries=2)
+def load_data(version):
+    with span("load_data"):
+        return get_catalog().books()
+
+
+@st.cache_resource(max_entries=2)
+def get_search_indexes(version):
+    return build_search_indexes(load_data(version))
+
+
+@st.cache_data(max_entries=2)
+def get_filter_options(version):
+    # Значения для панели фильтров: языки и издатели по убыванию числа книг
+    books = load_data(version)
+    dates = books['publication_date'].dropna()
+    return {
+        'language_code': books['language_code'].value_counts().index.astype(str).tolist(),
+        'publisher': books['publisher'].value_counts().index.astype(str).tolist(),
+        'max_pages': int(books['num_pages'].max()),
+        'years': (int(dates.min().year), int(dates.max().year)),
+    }
+
+
+def filter_panel(options):
+    # Пустой словарь — фильтров нет; значения по умолчанию не ограничивают выдачу
+    filters = {}
+    with st.sidebar.expander("Фильтры"):
+        languages = st.multiselect("Язык:", options['language_code'])
+        if languages:
+            filters['language_code'] = languages
+        publishers = st.multiselect("Издатель:", options['publisher'])
+        if publishers:
+            filters['publisher'] = publishers
+        pages = st.slider("Страниц:", 0, options['max_pages'], (0, options['max_pages']))
+        if pages != (0, options['max_pages']):
+            filters['num_pages'] = pages
+        years = st.slider("Год публикации:", *options['years'], options['years'])
+        if years != options['years']:
+            filters['publication_date'] = (f"{years[0]}-01-01", f"{years[1]}-12-31")
+        min_ratings = st.number_input("Не меньше оценок:", min_value=0, value=0, step=100)
+        if min_ratings:
+            filters['ratings_count'] = (min_ratings, None)
+    return filters
+
+
+def history_panel(recommender, index):
+    # История чтения живёт в st.session_state и своя у каждой сессии; возвращает
+    # список bookID или None, пока история пуста
+    history = st.session_state.setdefault('history', [])
+    title = search_box(index, "Добавьте прочитанную книгу:", "history")
+    if st.sidebar.button("Добавить в историю", disabled=title is None):
+        book_id = recommender.find_book(title)
+        if book_id is not None and book_id not in history:
+            history.append(book_id)
+    titles = recommender.book_titles(history)
+    kept = st.sidebar.multiselect(
+        "Прочитанные книги:", history, default=history, format_func=lambda book_id: titles.get(book_id, str(book_id))
+    )
+    st.session_state['history'] = kept
+    return kept or None
+
+
+def cards_html(recommendations, start=0):
+    cards = []
+    for i, book in enumerate(recommendations, start + 1):
+        date = book['publication_date'].date() if pd.notnull(book['publication_date']) else 'Неизвестно'
+        cards.append(f"""<div class="recommendation-card">
+<h3>{i}. {escape(str(book['title']))}</h3>
+<p><strong>Автор(ы):</strong> {escape(str(book['authors']))}</p>
+<p><strong>Похожесть:</strong> {book['similarity']:.2f}</p>
+<p><strong>Дата публикации:</strong> {date}</p>
+<div class="metric-row">
+<div class="metric-card"><h4>Рейтинг</h4><h2>⭐ {book['average_rating']:.2f}</h2></div>
+<div class="metric-card"><h4>Страниц</h4><h2>📄 {book['num_pages']}</h2></div>
+<div class="metric-card"><h4>Оценок</h4><h2>📊 {book['ratings_count']:,}</h2></div>
+</div>
+</div>""")
+    return "\n".join(cards)
+
+
+def fetch_pages(recommender, request, shown):
+    # Страницы по PAGE_SIZE, пока не наберётся shown или не кончится выдача
+    pages = []
+    for page in range(-(-shown // PAGE_SIZE)):
+        recommendations = recommender.recommend_page(
+            request['query'], request['by'], page, PAGE_SIZE, request['weights'], request['filters']
+        )
+        pages.append(recommendations[:max(shown - page * PAGE_SIZE, 0)])
+        if len(recommendations) < PAGE_SIZE:
+            break
+    return pages
+
+
+def show_more():
+    st.session_state['shown'] = st.session_state.get('shown', PAGE_SIZE) + PAGE_SIZE
+
+
+def search_box(index, label, key):
+    # Вместо выпадающего списка всего каталога — поле ввода и до TYPEAHEAD_LIMIT подсказок
+    text = st.sidebar.text_input(label, key=f"{key}_query")
+    options = index.search(text, TYPEAHEAD_LIMIT)
+    if not options:
+        st.sidebar.caption("Ничего не найдено")
+        return None
+    return st.sidebar.selectbox("Выберите из найденного:", options=options, key=f"{key}_choice")
+
+
+@st.cache_resource
+def figure_cache():
+    # Готовые PNG и JSON графиков на диске, общие для процессов и перезапусков
+    return DiskCache(os.environ.get("NEXTBOOK_FIGURE_CACHE", FIGURE_CACHE_DIR), max_bytes=FIGURE_CACHE_BYTES)
 
-        .stButton>button {
-            width: 100%;
-            background: linear-gradient(90deg, #6C63FF, #A084DC);
-            color: white;
-            border: none;
-            padding: 0.6rem;
-            border-radius: 0.5rem;
-            font-weight: bold;
-            transition: background 0.3s ease, transform 0.3s ease;
-        }
-        .stButton>button:hover {
-            background: linear-gradient(90deg, #4C47E3, #6F5BB5);
-            transform: scale(1.05);
-            color: white;
-        }
-        .recommendation-card {
-            padding: 1.5rem;
-            border-radius: 1rem;
-            background: linear-gradient(135deg, #F0F0F5, #D9D9E4);
-            margin: 1rem 0;
-            border-left: 5px solid #6C63FF;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-            color: #333333;
-            transition: transform 0.3s ease, box-shadow 0.3s ease;
-        }
-        .recommendation-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 8px 16px rgba(0,0,0,0.15);
-        }
-        .metric-card {
-            background-color: #ffffff;
-            padding: 1rem;
-            border-radius: 0.8rem;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            color: black;
-            transition: transform 0.3s ease, box-shadow 0.3s ease;
-        }
-        .metric-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 6px 12px rgba(0,0,0,0.15);
-        }
-        </style>
-    """, unsafe_allow_html=True)
-
-class BookRecommender:
-    def __init__(self, data):
-        self.df = pd.DataFrame(data)
-        self.df['title'] = self.df['title'].str.strip()
-        self.df['authors'] = self.df['authors'].str.strip()
-        self.df['clean_title'] = self.df['title'].str.replace(r'\(.*\)', '', regex=True).str.strip()
-        self.df['publication_date'] = pd.to_datetime(self.df['publication_date'], errors='coerce')
-        self.df = self.df.dropna(subset=['title', 'authors', 'average_rating'])
-
-    def get_title_similarity(self, title1, title2):
-        return SequenceMatcher(None, title1.lower(), title2.lower()).ratio()
-
-    def get_author_similarity(self, author1, author2):
-        authors1 = set(author1.lower().replace('/', ',').split(','))
-        authors2 = set(author2.lower().replace('/', ',').split(','))
-        intersection = len(authors1.intersection(authors2))
-        union = len(authors1.union(authors2))
-        return intersection / union if union > 0 else 0
-
-    def recommend_books(self, query, by='title', n_recommendations=5):
-        similarities = []
-        if by == 'title':
-            for idx, row in self.df.iterrows():
-                similarity = self.get_title_similarity(query, row['clean_title'])
-                if similarity < 1.0:
-                    similarities.append(self._create_recommendation_dict(row, similarity))
-        elif by == 'author':
-            for idx, row in self.df.iterrows():
-                similarity = self.get_author_similarity(query, row['authors'])
-                similarities.append(self._create_recommendation_dict(row, similarity))
-
-        return sorted(similarities, key=lambda x: (x['similarity'], x['average_rating']), reverse=True)[:n_recommendations]
-
-    def _create_recommendation_dict(self, row, similarity):
-        return {
-            'bookID': row['bookID'],
-            'title': row['title'],
-            'authors': row['authors'],
-            'similarity': similarity,
-            'average_rating': row['average_rating'],
-            'publication_date': row.get('publication_date', 'N/A'),
-            'ratings_count': row.get('ratings_count', 0),
-            'num_pages': row.get('num_pages', 'N/A')
-        }
+
+@st.cache_resource(max_entries=2)
+def get_analytics_images(version):
+    # matplotlib, seaborn и wordcloud импортируются только при первой отрисовке
+    # аналитики; при попадании в дисковый кэш агрегаты даже не считаются
+    from analytics import CHARTS, render_chart
+
+    catalog = get_catalog()
+    fingerprint = catalog.fingerprint
+    return {
+        name: figure_cache().get_or_create(
+            ('analytics', fingerprint, name), lambda name=name: render_chart(name, catalog.aggregates())
+        )
+        for name in CHARTS
+    }
+
+
+def ratings_chart(request, shown, pages):
+    # JSON фигуры px.bar для текущего запроса; ключ — данные, параметры запроса и
+    # число показанных карточек
+    key = ('ratings_bar', get_catalog().fingerprint, request, shown)
+    with span("plotly_bar"):
+        return json.loads(figure_cache().get_or_create(key, lambda: ratings_figure(pages), ext='json'))
+
+
+def ratings_figure(pages):
+    import plotly.express as px
+
+    fig = px.bar(
+        pd.concat([recommendations.frame() for recommendations in pages], ignore_index=True),
+        x='title',
+        y='average_rating',
+        title='Сравнение рейтингов книг',
+        labels={'title': 'Название книги', 'average_rating': 'Средний рейтинг'},
+        color='average_rating',
+        color_continuous_scale='purples'
+    )
+    fig.update_layout(showlegend=False)
+    return fig.to_json().encode('utf-8')
+
+
+@st.cache_resource
+def startup_state():
+    # Живёт весь процесс: время первого прогона скрипта после старта сервера
+    return {}
 
 
 @st.cache_data
-def load_data():
-    try:
-        data = pd.read_csv("books.csv", on_bad_lines='skip')
-        data['title'] = data['title'].str.strip()
-        data['authors'] = data['authors'].str.strip()
-        data['publication_date'] = pd.to_datetime(data['publication_date'], errors='coerce')
-        data = data.dropna(subset=['title', 'authors', 'average_rating'])
-        return data
-    except Exception as e:
-        st.error(f"Ошибка загрузки данных: {e}")
-        return pd.DataFrame()
+def get_startup_report():
+    from startup import import_times
+
+    return [import_times(module) for module in ("BookRecommender", "recommender")]
+
+
+def export_metrics():
+    # NEXTBOOK_METRICS_FILE — путь для текстового файла метрик Prometheus,
+    # NEXTBOOK_METRICS_PORT — порт локального эндпоинта /metrics
+    path = os.environ.get("NEXTBOOK_METRICS_FILE")
+    if path:
+        write_metrics(path)
+    port = os.environ.get("NEXTBOOK_METRICS_PORT")
+    if port:
+        serve_metrics(int(port))
+
+
+def render_timing_panel(trace):
+    if not st.sidebar.checkbox("Показать тайминги этапов", value=False):
+        return
+    st.sidebar.markdown("#### ⏱ Тайминги этого запуска")
+    if not trace:
+        st.sidebar.caption("Все этапы взяты из кэша")
+        return
+    st.sidebar.dataframe(
+        pd.DataFrame(trace, columns=['Этап', 'мс']).round({'мс': 2}),
+        hide_index=True
+    )
+
+
+def render_startup_panel():
+    if not st.sidebar.checkbox("Диагностика запуска", value=False):
+        return
+    state = startup_state()
+    st.sidebar.markdown("#### 🚀 Холодный старт")
+    if 'first_run_ms' in state:
+        st.sidebar.caption(f"Первый прогон скрипта (импорты + отрисовка): {state['first_run_ms']:.0f} мс")
+    for report in get_startup_report():
+        heavy = ", ".join(report['heavy_loaded']) or "нет"
+        st.sidebar.caption(f"import {report['module']}: {report['import_ms']:.0f} мс, визуализация: {heavy}")
+        st.sidebar.dataframe(
+            pd.DataFrame(report['packages'], columns=['Пакет', 'мс']),
+            hide_index=True
+        )
 
 
 def main():
+    setup_page()
+    trace = start_trace()
+    try:
+        with span("rerun"):
+            render_app()
+    finally:
+        startup_state().setdefault('first_run_ms', (time.perf_counter() - _started) * 1000)
+        export_metrics()
+        render_timing_panel(trace)
+        render_startup_panel()
+
+
+def render_app():
     st.title("📚 NextBook — найди свою следующую любимую книгу")
     st.markdown("""
     **NextBook** — это интеллектуальная рекомендательная система, которая помогает пользователю найти новую интересную книгу на основе:
     - Названия книги 📖
     - Имени автора 👩‍💼  
+    - Смешанной оценки по названию, автору, издателю и популярности 🧮
+    - Слов из названия и серии книги 🔎
+    - Истории прочитанных книг 📚
     """)
     st.markdown("#### Открой мир новых любимых книг!")
     
-    data = load_data()
+    try:
+        version = dataset_version()
+        data = load_data(version)
+    except Exception as e:
+        st.error(f"Ошибка загрузки данных: {e}")
+        return
     if data.empty:
         st.error("Данные не загружены. Проверь файл CSV.")
         return
 
-    recommender = BookRecommender(data)
+    recommender = get_recommender()
 
     st.sidebar.header("Настройки рекомендаций")
 
+    skipped = get_catalog().artifact.manifest['load_report']['skipped_lines']
+    if skipped:
+        st.sidebar.caption(f"Пропущено повреждённых строк CSV: {len(skipped)}")
+
     search_type = st.sidebar.radio(
         "Искать по:",
-        ["Название книги", "Автор"]
+        ["Название книги", "Автор", "Смешанный режим", "Слова в названии", "По истории чтения"]
     )
 
+    indexes = get_search_indexes(version)
+    weights = None
     if search_type == "Название книги":
-        query = st.sidebar.selectbox("Выберите книгу:", options=data['title'].unique())
+        query = search_box(indexes['title'], "Начните вводить название:", "title")
         by = 'title'
+    elif search_type == "Смешанный режим":
+        query = search_box(indexes['title'], "Начните вводить название:", "title")
+        by = 'hybrid'
+        with st.sidebar.expander("Веса признаков"):
+            weights = {
+                name: st.slider(label, 0.0, 1.0, DEFAULT_WEIGHTS[name], 0.05)
+                for name, label in HYBRID_LABELS.items()
+            }
+    elif search_type == "По истории чтения":
+        query = history_panel(recommender, indexes['title'])
+        by = 'history'
+        with st.sidebar.expander("Веса признаков"):
+            weights = {
+                name: st.slider(label, 0.0, 1.0, DEFAULT_WEIGHTS[name], 0.05, key=f"history_{name}")
+                for name, label in HYBRID_LABELS.items()
+            }
+    elif search_type == "Слова в названии":
+        # Произвольные слова и серия ("harry potter #3"): поиск BM25 по словам названия
+        query = st.sidebar.text_input("Слова из названия или серии:", key="tokens_query").strip() or None
+        by = 'tokens'
     else:
-        query = st.sidebar.selectbox("Выберите автора:", options=data['authors'].unique())
+        query = search_box(indexes['authors'], "Начните вводить имя автора:", "authors")
         by = 'author'
 
     n_recommendations = st.sidebar.slider(
         "Количество рекомендаций:",
         min_value=1,
-        max_value=10,
+        max_value=MAX_RECOMMENDATIONS,
         value=5
     )
+    filters = filter_panel(get_filter_options(version))
+
+    if st.sidebar.button("Получить рекомендации", disabled=query is None):
+        # Запрос запоминается в сессии: «Показать ещё» перезапускает скрипт без этой кнопки
+        st.session_state['request'] = {
+            'query': list(query) if by == 'history' else query, 'by': by, 'n': n_recommendations,
+            'weights': weights, 'filters': filters,
+        }
+        st.session_state['shown'] = PAGE_SIZE
+
+    request = st.session_state.get('request')
+    if request is None:
+        return
+    shown = min(st.session_state.get('shown', PAGE_SIZE), request['n'])
+    pages = fetch_pages(recommender, request, shown)
+    if not len(pages[0]):
+        st.warning("Подходящих книг не нашлось — измените запрос или фильтры.")
+        return
+
+    tab1, tab2 = st.tabs(["📖 Рекомендации", "📊 Аналитика"])
+
+    with tab1:
+        # Страница карточек — один HTML-блок, а не колонки и markdown на каждую книгу
+        with span("render_cards", shown=shown):
+            for page, recommendations in enumerate(pages):
+                st.markdown(cards_html(recommendations, page * PAGE_SIZE), unsafe_allow_html=True)
+        total = sum(len(recommendations) for recommendations in pages)
+        st.caption(f"Показано рекомендаций: {total}")
+        if total == shown and shown < request['n']:
+            st.button("Показать ещё", on_click=show_more)
+
+    with tab2: # График баров: средние рейтинги рекомендованных книг
+        st.plotly_chart(ratings_chart(request, shown, pages), use_container_width=True)
+
+        # Дополнительные графики — на основе всего датасета, предвычислены один раз на версию
+        with span("analytics"):
+            images = get_analytics_images(version)
+
+        st.markdown("### 📈 Топ-10 самых популярных книг")
+        st.image(images['top_books'])
+
+        # Облако слов — названия книг по рейтингу
+        st.subheader("☁️ Облако популярных книг")
+        st.image(images['title_cloud'])
+
+        st.markdown("---")
+
+        st.subheader("📚 Топ-10 авторов")
+        st.image(images['top_authors'])
 
-    if st.sidebar.button("Получить рекомендации"):
-        recommendations = recommender.recommend_books(query, by, n_recommendations)
-
-        tab1, tab2 = st.tabs(["📖 Рекомендации", "📊 Аналитика"])
-
-        with tab1:
-            for i, book in enumerate(recommendations, 1):
-                with st.container():
-                    st.markdown(f"""
-                    <div class="recommendation-card">
-                        <h3>{i}. {book['title']}</h3>
-                        <p><strong>Автор(ы):</strong> {book['authors']}</p>
-                        <p><strong>Похожесть:</strong> {book['similarity']:.2f}</p>
-                        <p><strong>Дата публикации:</strong> {book['publication_date'].date() if pd.notnull(book['publication_date']) else 'Неизвестно'}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                    col1, col2, col3 = st.columns(3)
-
-                    with col1:
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <h4>Рейтинг</h4>
-                            <h2>⭐ {book['average_rating']:.2f}</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with col2:
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <h4>Страниц</h4>
-                            <h2>📄 {book['num_pages']}</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with col3:
-                        st.markdown(f"""
-                        <div class="metric-card">
-                            <h4>Оценок</h4>
-                            <h2>📊 {book['ratings_count']:,}</h2>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-        with tab2: # График баров: средние рейтинги рекомендованных книг
-            fig_ratings = px.bar(
-                pd.DataFrame(recommendations),
-                x='title',
-                y='average_rating',
-                title='Сравнение рейтингов книг',
-                labels={'title': 'Название книги', 'average_rating': 'Средний рейтинг'},
-                color='average_rating',
-                color_continuous_scale='purples'
-            )
-            fig_ratings.update_layout(showlegend=False)
-            st.plotly_chart(fig_ratings, use_container_width=True)
-            
-            # Дополнительные графики — на основе всего датасета
-            st.markdown("### 📈 Топ-10 самых популярных книг")
-            
-            # Топ-10 популярных книг
-            book_counts = (
-                data.groupby('title')['average_rating']
-                .count()
-                .sort_values(ascending=False)
-            )
-            popular_books = book_counts.reset_index()
-            popular_books.columns = ['title', 'rating_count']
-            
-            top_10_books = popular_books.head(10)
-            
-            # Построение графика через matplotlib/seaborn
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.barplot(x='rating_count', y='title', data=top_10_books, palette='Set3', ax=ax)
-            ax.set_xlabel('Рейтинг', fontsize=12)
-            ax.set_ylabel('Название книги', fontsize=12)
-            ax.set_title('Топ-10 самых популярных книг по рейтингу', fontsize=14)
-            st.pyplot(fig)
-            
-            # Облако слов — названия книг по рейтингу
-            st.subheader("☁️ Облако популярных книг")
-            book_string = " ".join((title + " ") * count for title, count in book_counts.items())
-            
-            custom_stopwords = set(STOPWORDS) - {"the", "a", "and", "in", "is", "of", "to"}
-            
-            wc = WordCloud(
-                width=1000,
-                height=600,
-                max_font_size=120,
-                stopwords=custom_stopwords,
-                background_color='white'
-            ).generate(book_string)
-            
-            fig_wc, ax_wc = plt.subplots(figsize=(16, 8))
-            ax_wc.imshow(wc, interpolation='bilinear')
-            ax_wc.axis('off')
-
-            st.pyplot(fig_wc)
-
-            st.markdown("---")
-            
-            st.subheader("📚 Топ-10 авторов")
-            
-            # Подсчёт количества оценок по авторам
-            author_counts = (
-                data.groupby('authors')['average_rating']
-                .count()
-                .sort_values(ascending=False)
-            )
-            
-            top_authors = author_counts.head(10).reset_index()
-            top_authors.columns = ['authors', 'rating_count']
-            
-            # Построение графика Seaborn
-            fig_authors, ax = plt.subplots(figsize=(10, 6))
-            sns.barplot(x='rating_count', y='authors', data=top_authors, palette='viridis', ax=ax)
-            ax.set_xlabel('Количество оценок', fontsize=12)
-            ax.set_ylabel('Автор', fontsize=12)
-            ax.set_title('Топ-10 авторов по количеству оценок', fontsize=16)
-            st.pyplot(fig_authors)
-            
-            # Облако слов по авторам
-            st.subheader("☁️ Облако популярных авторов")
-            
-            author_string = " ".join((author + " ") * count for author, count in author_counts.items())
-            
-            stop_words = set(STOPWORDS)
-            
-            wc = WordCloud(
-                width=1000,
-                height=600,
-                max_font_size=120,
-                stopwords=stop_words,
-                background_color='white'
-            ).generate(author_string)
-            
-            fig_wc, ax_wc = plt.subplots(figsize=(12, 6))
-            ax_wc.imshow(wc, interpolation='bilinear')
-            ax_wc.axis('off')
-            st.pyplot(fig_wc)
+        # Облако слов по авторам
+        st.subheader("☁️ Облако популярных авторов")
+        st.image(images['author_cloud'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+import io
+from collections import Counter
+from functools import lru_cache
+
+import pandas as pd
+
+from instrumentation import span
+
+# matplotlib, seaborn и wordcloud импортируются при первой отрисовке или
+# подсчёте слов: рекомендательный путь и холодный старт приложения их не грузят
+
+TOP_N = 10
+
+
+@lru_cache(maxsize=None)
+def stopwords(kind):
+    from wordcloud import STOPWORDS
+
+    if kind == 'title':
+        return frozenset(STOPWORDS) - {"the", "a", "and", "in", "is", "of", "to"}
+    return frozenset(STOPWORDS)
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def rating_counts(data, column):
+    # Количество оценок (изданий) по произведению (work_id), названию или автору, по убыванию
+    return (
+        data.groupby(column)['average_rating']
+        .count()
+        .sort_values(ascending=False)
+    )
+
+
+def word_frequencies(counts, stopwords):
+    # Частоты слов для облака без склейки гигантской строки (value + " ") * count:
+    # каждое значение разбирается один раз, а его слова умножаются на count
+    from wordcloud import WordCloud
+
+    tokenizer = WordCloud(stopwords=stopwords, collocations=False)
+    totals = Counter()
+    forms = {}
+    for value, count in counts.items():
+        for word, freq in tokenizer.process_text(str(value)).items():
+            key = word.lower()
+            totals[key] += freq * count
+            forms.setdefault(key, Counter())[word] += freq * count
+    return {forms[key].most_common(1)[0][0]: total for key, total in totals.items()}
+
+
+def compute_aggregates(data):
+    # Всё, что вкладка «Аналитика» показывает по всему датасету; от запроса не зависит
+    with span("analytics.aggregates"):
+        return _compute_aggregates(data)
+
+
+def _compute_aggregates(data):
+    author_counts = rating_counts(data, 'authors')
+    aggregates = {
+        'author_counts': author_counts,
+        'author_words': word_frequencies(author_counts, stopwords('authors')),
+    }
+    if 'work_id' in data:
+        # Издания одного произведения считаются вместе: группировка по целому
+        # work_id, подпись — название канонического издания (works.work_titles)
+        from works import work_titles
+
+        aggregates['work_titles'] = work_titles(data)
+        aggregates['title_counts'] = rating_counts(data, 'work_id')
+        labelled = _labelled(aggregates['title_counts'], aggregates['work_titles'])
+    else:
+        labelled = aggregates['title_counts'] = rating_counts(data, 'title')
+    aggregates['title_words'] = word_frequencies(labelled, stopwords('title'))
+    return _with_tops(aggregates)
+
+
+def _labelled(counts, titles):
+    return pd.Series(counts.to_numpy(), index=titles.reindex(counts.index).to_numpy())
+
+
+def _with_tops(aggregates):
+    title_counts = aggregates['title_counts']
+    if 'work_titles' in aggregates:
+        title_counts = _labelled(title_counts, aggregates['work_titles'])
+    top_books = title_counts.head(TOP_N).reset_index()
+    top_books.columns = ['title', 'rating_count']
+    top_authors = aggregates['author_counts'].head(TOP_N).reset_index()
+    top_authors.columns = ['authors', 'rating_count']
+    return dict(aggregates, top_books=top_books, top_authors=top_authors)
+
+
+def _patch_counts(counts, delta):
+    counts = counts.add(delta, fill_value=0).astype('int64')
+    return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+
+def _patch_words(words, delta):
+    words = dict(words)
+    for word, freq in delta.items():
+        total = words.get(word, 0) + freq
+        if total > 0:
+            words[word] = total
+        else:
+            words.pop(word, None)
+    return words
+
+
+def update_aggregates(aggregates, added=None, removed=None):
+    # Пересчёт только по изменившимся книгам: счётчики и частоты слов
+    # правятся на разницу, а топ-10 берётся из уже отсортированных счётчиков
+    with span("analytics.update"):
+        updated = dict(aggregates)
+        for frame, sign in ((added, 1), (removed, -1)):
+            if frame is None or len(frame) == 0:
+                continue
+            for column, counts_key, words_key in (
+                ('title', 'title_counts', 'title_words'),
+                ('authors', 'author_counts', 'author_words'),
+            ):
+                if column == 'title' and 'work_titles' in updated:
+                    # Подпись произведения фиксируется при первом появлении и
+                    # уточняется при следующем полном пересчёте
+                    from works import work_titles
+
+                    titles = work_titles(frame)
+                    known = updated['work_titles']
+                    updated['work_titles'] = pd.concat([known, titles[~titles.index.isin(known.index)]])
+                    delta = frame.groupby('work_id')['average_rating'].count() * sign
+                    updated[counts_key] = _patch_counts(updated[counts_key], delta)
+                    delta = _labelled(delta, updated['work_titles'])
+                else:
+                    delta = frame.groupby(column)['average_rating'].count() * sign
+                    updated[counts_key] = _patch_counts(updated[counts_key], delta)
+                updated[words_key] = _patch_words(updated[words_key], word_frequencies(delta, stopwords(column)))
+        return _with_tops(updated)
+
+
+def figure_png(fig):
+    # Кодирует фигуру в PNG и сразу закрывает её, чтобы pyplot не копил фигуры
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+    finally:
+        _pyplot().close(fig)
+    return buffer.getvalue()
+
+
+def barplot_png(table, x, y, palette, xlabel, ylabel, title, title_size):
+    import seaborn as sns
+
+    with span("analytics.barplot", chart=y):
+        fig, ax = _pyplot().subplots(figsize=(10, 6))
+        sns.barplot(x=x, y=y, data=table, hue=y, palette=palette, legend=False, ax=ax)
+        ax.set_xlabel(xlabel, fontsize=12)
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.set_title(title, fontsize=title_size)
+        return figure_png(fig)
+
+
+def wordcloud_png(frequencies, figsize):
+    from wordcloud import WordCloud
+
+    with span("analytics.wordcloud"):
+        wc = WordCloud(
+            width=1000,
+            height=600,
+            max_font_size=120,
+            background_color='white'
+        ).generate_from_frequencies(frequencies)
+
+        fig, ax = _pyplot().subplots(figsize=figsize)
+        ax.imshow(wc, interpolation='bilinear')
+        ax.axis('off')
+        return figure_png(fig)
+
+
+CHARTS = ('top_books', 'title_cloud', 'top_authors', 'author_cloud')
+
+
+def render_chart(name, aggregates):
+    # PNG одного графика вкладки «Аналитика»; имена — CHARTS
+    if name == 'top_books':
+        return barplot_png(
+            aggregates['top_books'], 'rating_count', 'title', 'Set3',
+            'Рейтинг', 'Название книги', 'Топ-10 самых популярных книг по рейтингу', 14
+        )
+    if name == 'title_cloud':
+        return wordcloud_png(aggregates['title_words'], (16, 8))
+    if name == 'top_authors':
+        return barplot_png(
+            aggregates['top_authors'], 'rating_count', 'authors', 'viridis',
+            'Количество оценок', 'Автор', 'Топ-10 авторов по количеству оценок', 16
+        )
+    if name == 'author_cloud':
+        return wordcloud_png(aggregates['author_words'], (12, 6))
+    raise ValueError(f"Неизвестный график: {name}")
+
+
+def render_analytics(aggregates):
+    return {name: render_chart(name, aggregates) for name in CHARTS}
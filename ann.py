@@ -0,0 +1,207 @@
+import argparse
+import time
+import zlib
+
+import numpy as np
+import scipy.sparse as sp
+
+from instrumentation import span
+from similarity import top_n
+
+# Приближённый поиск по названиям для каталогов в миллионы книг: IVF (инвертированные
+# списки) поверх n-граммных векторов, хэшированных в пространство фиксированной
+# размерности. Кандидаты из n_probe ближайших кластеров пересчитываются точно
+# по исходной матрице TitleIndex, поэтому оценки совпадают с точным режимом.
+
+HASH_DIM = 2048
+
+
+def hash_projection(vocab, dim=HASH_DIM):
+    # Разреженная матрица V x dim: n-грамма -> корзина crc32 со знаком ±1.
+    # Зависит только от строки n-граммы, поэтому новые n-граммы проецируются так же
+    grams = list(vocab)
+    hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32, count=len(grams))
+    buckets = (hashes % dim).astype(np.int32)
+    signs = np.where((hashes >> 31) & 1, -1.0, 1.0).astype(np.float32)
+    return sp.csr_matrix((signs, (np.arange(len(grams)), buckets)), shape=(len(grams), dim))
+
+
+def _normalize_rows(matrix):
+    if sp.issparse(matrix):
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms).dot(matrix), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class IVFTitleIndex:
+    def __init__(self, title_index, n_lists=None, n_probe=8, dim=HASH_DIM,
+                 iterations=10, sample_size=50000, seed=0, chunk_size=65536):
+        self.exact = title_index
+        self.n_probe = n_probe
+        self.dim = dim
+        n_rows = len(title_index)
+        self.n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+
+        self.projection = hash_projection(title_index.vocab, dim)
+        # Дописанные после сборки строки (дельта TitleIndex) входят в кластеры наравне с остальными
+        matrix = title_index.matrix if title_index.delta is None else title_index.rows_matrix(np.arange(n_rows))
+        hashed = _normalize_rows(matrix.dot(self.projection))
+
+        rng = np.random.default_rng(seed)
+        sample = hashed[rng.choice(n_rows, size=min(sample_size, n_rows), replace=False)]
+        self.centroids = self._train(sample, iterations, rng)
+
+        labels = np.empty(n_rows, dtype=np.int32)
+        for start in range(0, n_rows, chunk_size):
+            block = hashed[start:start + chunk_size]
+            labels[start:start + chunk_size] = self._assign(block)
+        self._set_labels(labels)
+
+    def _assign(self, hashed):
+        return np.asarray(hashed.dot(self.centroids.T)).argmax(axis=1).astype(np.int32)
+
+    def _set_labels(self, labels):
+        self.labels = labels
+        self.rows = np.argsort(labels, kind='stable').astype(np.int32)
+        self.offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.n_lists), out=self.offsets[1:])
+        # Дописанные после построения позиции и их кластеры (см. append)
+        self.extra_rows = np.empty(0, dtype=np.int32)
+        self.extra_labels = np.empty(0, dtype=np.int32)
+
+    def append(self, positions):
+        # Новые строки относятся к ближайшему центроиду без переобучения k-means.
+        # Проекция пересчитывается, потому что словарь n-грамм мог вырасти
+        positions = np.asarray(positions, dtype=np.int32)
+        if not len(positions):
+            return
+        self.projection = hash_projection(self.exact.vocab, self.dim)
+        hashed = _normalize_rows(self.exact.rows_matrix(positions).dot(self.projection))
+        self.extra_rows = np.concatenate([self.extra_rows, positions])
+        self.extra_labels = np.concatenate([self.extra_labels, self._assign(hashed)])
+
+    def compacted(self, exact, keep):
+        # IVF для сжатого TitleIndex: центроиды те же, позиции перенумерованы
+        index = self.__class__.__new__(self.__class__)
+        index.exact = exact
+        index.n_probe = self.n_probe
+        index.dim = self.dim
+        index.n_lists = self.n_lists
+        index.centroids = self.centroids
+        index.projection = hash_projection(exact.vocab, self.dim)
+        labels = np.concatenate([self.labels, self.extra_labels[np.argsort(self.extra_rows, kind='stable')]])
+        index._set_labels(labels[keep])
+        return index
+
+    def _train(self, sample, iterations, rng):
+        # Сферический k-means: близость — скалярное произведение нормированных векторов
+        n_lists = min(self.n_lists, sample.shape[0])
+        self.n_lists = n_lists
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].toarray()
+        for _ in range(iterations):
+            labels = np.asarray(sample.dot(centroids.T)).argmax(axis=1)
+            members = sp.csr_matrix(
+                (np.ones(len(labels), dtype=np.float32), (labels, np.arange(len(labels)))),
+                shape=(n_lists, sample.shape[0])
+            )
+            updated = np.asarray(members.dot(sample).todense())
+            empty = np.flatnonzero(np.bincount(labels, minlength=n_lists) == 0)
+            if len(empty):
+                updated[empty] = sample[rng.choice(sample.shape[0], size=len(empty), replace=False)].toarray()
+            centroids = _normalize_rows(updated)
+        return centroids
+
+    def __len__(self):
+        return len(self.exact)
+
+    def candidates(self, query_vector, n_probe=None):
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        hashed = self.projection.T.dot(query_vector[:self.projection.shape[0]])
+        closeness = self.centroids.dot(hashed)
+        if n_probe < self.n_lists:
+            probe = np.argpartition(-closeness, n_probe - 1)[:n_probe]
+        else:
+            probe = np.arange(self.n_lists)
+        lists = [self.rows[self.offsets[c]:self.offsets[c + 1]] for c in probe]
+        if len(self.extra_rows):
+            lists.append(self.extra_rows[np.isin(self.extra_labels, probe)])
+        rows = np.sort(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int32)
+        if len(self.exact.removed):
+            rows = rows[~np.isin(rows, self.exact.removed)]
+        return rows
+
+    def search(self, query, tiebreak, n, n_probe=None, mask=None):
+        with span("title.ann.probe"):
+            query_vector = self.exact.query_vector(query.lower())
+            rows = self.candidates(query_vector, n_probe)
+        with span("title.ann.score"):
+            scores = self.exact.rows_matrix(rows).dot(query_vector).astype(np.float64)
+            excluded = self.exact.titles.positions(query.lower())
+            if len(excluded):
+                scores[np.isin(rows, excluded)] = -np.inf
+            if mask is not None:
+                scores[~mask[rows]] = -np.inf
+        with span("title.select"):
+            local = top_n(scores, tiebreak[rows], n)
+        return rows[local], scores[local]
+
+    def recall(self, queries, tiebreak, n, n_probe=None):
+        # recall@N относительно точного сканирования всего каталога
+        found = total = 0
+        for query in queries:
+            reference, _ = self.exact.search(query, tiebreak, n)
+            approximate, _ = self.search(query, tiebreak, n, n_probe)
+            found += len(set(reference.tolist()) & set(approximate.tolist()))
+            total += len(reference)
+        return found / total if total else 1.0
+
+
+def report(recommender, n_probes, n_queries=200, n=10, seed=0):
+    # Таблица recall@N и задержки для разных n_probe на текущем каталоге
+    rng = np.random.default_rng(seed)
+    titles = recommender.df['title'].to_numpy()
+    queries = titles[rng.integers(0, len(titles), n_queries)].tolist()
+
+    started = time.perf_counter()
+    ann = IVFTitleIndex(recommender.title_index)
+    build = time.perf_counter() - started
+
+    rows = []
+    for n_probe in n_probes:
+        started = time.perf_counter()
+        for query in queries:
+            ann.search(query, recommender.ratings, n, n_probe)
+        ann_ms = (time.perf_counter() - started) * 1000 / n_queries
+        rows.append({
+            'n_probe': n_probe,
+            'recall': round(ann.recall(queries, recommender.ratings, n, n_probe), 4),
+            'ms_per_query': round(ann_ms, 3),
+        })
+
+    started = time.perf_counter()
+    for query in queries:
+        recommender.title_index.search(query, recommender.ratings, n)
+    exact_ms = (time.perf_counter() - started) * 1000 / n_queries
+    return {'n_lists': ann.n_lists, 'build_seconds': round(build, 3), 'exact_ms_per_query': round(exact_ms, 3), 'probes': rows}
+
+
+if __name__ == "__main__":
+    from artifact import DEFAULT_CSV
+    from loader import read_catalog
+    from recommender import BookRecommender
+
+    parser = argparse.ArgumentParser(description="Recall@N и задержка IVF-поиска по названиям")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-n", type=int, default=10)
+    args = parser.parse_args()
+
+    result = report(BookRecommender(read_catalog(args.csv)), args.n_probe, args.queries, args.n)
+    print(f"n_lists={result['n_lists']}, построение {result['build_seconds']} с, "
+          f"точный поиск {result['exact_ms_per_query']} мс/запрос")
+    for row in result['probes']:
+        print(f"n_probe={row['n_probe']:>3}  recall@{args.n}={row['recall']:.3f}  {row['ms_per_query']} мс/запрос")
@@ -0,0 +1,384 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from filters import FilterIndex
+from loader import LoadReport, read_catalog
+from positions import LOOKUP_COLUMNS, PositionIndex
+from similarity import AuthorIndex, TitleIndex, TokenIndex
+from works import cluster_works
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import fcntl
+except ImportError:
+    # Без fcntl (Windows) параллельные сборки одного каталога не согласуются
+    fcntl = None
+
+# Увеличивать при любом изменении формата файлов в каталоге артефакта
+ARTIFACT_VERSION = 6
+DEFAULT_CSV = "books.csv"
+DEFAULT_DIR = "artifacts"
+MANIFEST = "manifest.json"
+# Сколько прежних версий артефакта хранить рядом с текущей: процессы, открывшие
+# их до пересборки, продолжают читать свои файлы
+KEEP_VERSIONS = 1
+
+
+def csv_hash(csv_path):
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save_strings(directory, name, values):
+    # Строки хранятся как один UTF-8 буфер + смещения, чтобы их можно было mmap-ить
+    encoded = [b'' if pd.isna(v) else str(v).encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f"{name}.bytes.npy"), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+    np.save(os.path.join(directory, f"{name}.nulls.npy"), np.array([pd.isna(v) for v in values], dtype=bool))
+
+
+def _decode_strings(buffer, offsets, nulls):
+    raw = buffer.tobytes()
+    return [
+        None if nulls[i] else raw[offsets[i]:offsets[i + 1]].decode('utf-8')
+        for i in range(len(offsets) - 1)
+    ]
+
+
+def _arrow_strings(buffer, offsets, nulls):
+    # Строковая колонка поверх тех же буферов (mmap или shared memory) без копии:
+    # Arrow large_string с int64-смещениями — ровно формат _save_strings
+    validity = pa.array(~np.asarray(nulls)).buffers()[1] if nulls.any() else None
+    array = pa.LargeStringArray.from_buffers(
+        len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(buffer), validity, int(nulls.sum())
+    )
+    try:
+        from pandas.core.arrays.string_arrow import ArrowStringArray
+
+        # Тот же dtype "str", что у колонок, прочитанных из CSV
+        return ArrowStringArray(array, dtype=pd.StringDtype('pyarrow', na_value=np.nan))
+    except (ImportError, TypeError):
+        return pd.arrays.ArrowExtensionArray(array)
+
+
+@contextmanager
+def _build_lock(directory):
+    # Одна сборка каталога за раз; остальные процессы ждут её на flock
+    path = os.path.abspath(directory) + ".lock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _version_prefix(directory):
+    return f".{os.path.basename(os.path.abspath(directory))}.v-"
+
+
+def _publish(staging, directory):
+    # directory — символическая ссылка на версию рядом с ним; новая версия подменяет
+    # ссылку атомарно, а каталоги, которые могут быть открыты, не удаляются
+    directory = os.path.abspath(directory)
+    parent = os.path.dirname(directory)
+    prefix = _version_prefix(directory)
+    if os.path.isdir(directory) and not os.path.islink(directory):
+        # Каталог прежнего формата (не ссылка) становится одной из версий
+        os.replace(directory, tempfile.mkdtemp(prefix=prefix, dir=parent))
+    link = os.path.join(parent, f"{prefix}link-{os.getpid()}")
+    os.symlink(os.path.basename(staging), link)
+    os.replace(link, directory)
+
+    versions = sorted(
+        (entry for entry in os.scandir(parent)
+         if entry.name.startswith(prefix) and entry.is_dir(follow_symlinks=False) and entry.path != staging),
+        key=lambda entry: entry.stat(follow_symlinks=False).st_mtime, reverse=True
+    )
+    for entry in versions[KEEP_VERSIONS:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def build_artifact(csv_path=DEFAULT_CSV, directory=DEFAULT_DIR):
+    with _build_lock(directory):
+        return _build_artifact(csv_path, directory)
+
+
+def _build_artifact(csv_path, directory):
+    started = time.perf_counter()
+    report = LoadReport()
+    data = read_catalog(csv_path, report=report)
+    data['work_id'], data['work_block'] = cluster_works(data)
+    title_index = TitleIndex(data['clean_title'])
+    author_index = AuthorIndex(data['authors'])
+    token_index = TokenIndex(data['clean_title'], data['series'], data['series_number'])
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=_version_prefix(directory), dir=parent)
+
+    columns = []
+    for i, name in enumerate(data.columns):
+        column = data[name]
+        key = f"col{i}"
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Коды категорий mmap-ятся, сами категории — обычный строковый столбец
+            np.save(os.path.join(staging, f"{key}.npy"), column.cat.codes.to_numpy())
+            _save_strings(staging, f"{key}.categories", column.cat.categories.tolist())
+            columns.append({'name': name, 'key': key, 'kind': 'category'})
+        elif pd.api.types.is_numeric_dtype(column) or pd.api.types.is_datetime64_any_dtype(column):
+            np.save(os.path.join(staging, f"{key}.npy"), column.to_numpy())
+            columns.append({'name': name, 'key': key, 'kind': 'array'})
+        else:
+            _save_strings(staging, key, column.tolist())
+            columns.append({'name': name, 'key': key, 'kind': 'strings'})
+
+    title_state = title_index.state()
+    for part in ('data', 'indices', 'indptr', 'hashes', 'vocab_hashes', 'vocab_ids'):
+        np.save(os.path.join(staging, f"title_{part}.npy"), title_state[part])
+    _save_strings(staging, "title_vocab", title_state['vocab'])
+
+    author_state = author_index.state()
+    for part in ('rows', 'offsets', 'sizes', 'token_hashes', 'token_ids'):
+        np.save(os.path.join(staging, f"author_{part}.npy"), author_state[part])
+    _save_strings(staging, "author_tokens", author_state['tokens'])
+
+    # Хэши названий у TokenIndex те же, что у TitleIndex (title_hashes.npy)
+    token_state = token_index.state()
+    for part in ('data', 'indices', 'indptr', 'weights_data', 'weights_indices', 'weights_indptr', 'idf', 'vocab_hashes', 'vocab_ids'):
+        np.save(os.path.join(staging, f"tokens_{part}.npy"), token_state[part])
+    _save_strings(staging, "tokens_vocab", token_state['vocab'])
+
+    # Позиции строк по bookID, названию и автору (positions.py)
+    for column in LOOKUP_COLUMNS:
+        lookup_state = PositionIndex(data[column], strings=column != 'bookID').state()
+        for key in ('keys', 'order'):
+            np.save(os.path.join(staging, f"positions_{column}_{key}.npy"), lookup_state[key])
+
+    # Индекс фильтров выдачи (filters.py): порядок строк по колонкам и издания-представители
+    filter_state = FilterIndex(data).state()
+    for name, part in filter_state['categories'].items():
+        for key in ('value_hashes', 'value_ids', 'order', 'offsets'):
+            np.save(os.path.join(staging, f"filters_{name}_{key}.npy"), part[key])
+        _save_strings(staging, f"filters_{name}_values", part['values'])
+    for name, part in filter_state['ranges'].items():
+        for key in ('positions', 'values'):
+            np.save(os.path.join(staging, f"filters_{name}_{key}.npy"), part[key])
+    if filter_state['works'] is not None:
+        for key in ('order', 'canonical'):
+            np.save(os.path.join(staging, f"filters_works_{key}.npy"), filter_state['works'][key])
+
+    manifest = {
+        'version': ARTIFACT_VERSION,
+        'csv_sha256': csv_hash(csv_path),
+        'csv_size': os.path.getsize(csv_path),
+        'rows': len(data),
+        'columns': columns,
+        'filters': {
+            'categories': list(filter_state['categories']),
+            'ranges': list(filter_state['ranges']),
+            'works': filter_state['works'] is not None,
+        },
+        'load_report': report.as_dict(),
+        'build_seconds': round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    _publish(staging, directory)
+    return manifest
+
+
+def read_manifest(directory=DEFAULT_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(csv_path=DEFAULT_CSV, directory=DEFAULT_DIR):
+    manifest = read_manifest(directory)
+    return (
+        manifest is None
+        or manifest.get('version') != ARTIFACT_VERSION
+        or manifest.get('csv_sha256') != csv_hash(csv_path)
+    )
+
+
+class Artifact:
+    # Загруженный артефакт: числовые колонки и индексы — memory-mapped массивы,
+    # общие для всех процессов, открывших один и тот же каталог. Подклассы
+    # (shared.SharedArtifact) переопределяют только _array и _json
+    def __init__(self, directory, manifest):
+        # Ссылка разрешается один раз: пересборка не подменит файлы посреди открытия
+        self.directory = None if directory is None else os.path.realpath(directory)
+        self.manifest = manifest
+        if pa is not None:
+            # Данные строк лежат в файлах / сегменте, Arrow выделяет только мелкие
+            # служебные буферы; пул mimalloc по умолчанию резервировал бы под них
+            # ~4 МБ в каждом процессе
+            pa.set_memory_pool(pa.system_memory_pool())
+        self.columns = {}
+        for column in manifest['columns']:
+            if column['kind'] == 'array':
+                self.columns[column['name']] = self._array(f"{column['key']}.npy")
+            elif column['kind'] == 'category':
+                self.columns[column['name']] = pd.Categorical.from_codes(
+                    self._array(f"{column['key']}.npy"),
+                    categories=self._strings(f"{column['key']}.categories")
+                )
+            else:
+                self.columns[column['name']] = self._string_column(column['key'])
+
+        # Словари индексов — хэши в массивах и строки без декодирования, поэтому
+        # частная память процесса почти не зависит от размера каталога
+        title_hashes = self._array("title_hashes.npy")
+        self.title_index = TitleIndex.from_state(self.columns['clean_title'], {
+            'data': self._array("title_data.npy"),
+            'indices': self._array("title_indices.npy"),
+            'indptr': self._array("title_indptr.npy"),
+            'hashes': title_hashes,
+            'vocab': self._string_column("title_vocab"),
+            'vocab_hashes': self._array("title_vocab_hashes.npy"),
+            'vocab_ids': self._array("title_vocab_ids.npy"),
+        })
+        self.author_index = AuthorIndex.from_state({
+            'tokens': self._string_column("author_tokens"),
+            'token_hashes': self._array("author_token_hashes.npy"),
+            'token_ids': self._array("author_token_ids.npy"),
+            'rows': self._array("author_rows.npy"),
+            'offsets': self._array("author_offsets.npy"),
+            'sizes': self._array("author_sizes.npy"),
+        })
+        self.token_index = TokenIndex.from_state(self.columns['clean_title'], {
+            'data': self._array("tokens_data.npy"),
+            'indices': self._array("tokens_indices.npy"),
+            'indptr': self._array("tokens_indptr.npy"),
+            'hashes': title_hashes,
+            'vocab': self._string_column("tokens_vocab"),
+            'vocab_hashes': self._array("tokens_vocab_hashes.npy"),
+            'vocab_ids': self._array("tokens_vocab_ids.npy"),
+            **{part: self._array(f"tokens_{part}.npy") for part in ('weights_data', 'weights_indices', 'weights_indptr', 'idf')},
+        })
+        self.positions = {
+            column: PositionIndex.from_state(
+                {key: self._array(f"positions_{column}_{key}.npy") for key in ('keys', 'order')},
+                strings=column != 'bookID'
+            )
+            for column in LOOKUP_COLUMNS
+        }
+
+        filters = manifest['filters']
+        self.filters = FilterIndex.from_state(manifest['rows'], {
+            'categories': {
+                name: {
+                    'values': self._string_column(f"filters_{name}_values"),
+                    **{key: self._array(f"filters_{name}_{key}.npy") for key in ('value_hashes', 'value_ids', 'order', 'offsets')},
+                }
+                for name in filters['categories']
+            },
+            'ranges': {
+                name: {key: self._array(f"filters_{name}_{key}.npy") for key in ('positions', 'values')}
+                for name in filters['ranges']
+            },
+            'works': {
+                key: self._array(f"filters_works_{key}.npy") for key in ('order', 'canonical')
+            } if filters['works'] else None,
+        }, work_ids=self.columns.get('work_id'))
+
+    @property
+    def source(self):
+        # Чем открыть тот же артефакт в другом процессе (см. reopen_artifact)
+        return ('directory', os.path.abspath(self.directory))
+
+    def _array(self, filename):
+        return np.load(os.path.join(self.directory, filename), mmap_mode='r')
+
+    def _json(self, filename):
+        try:
+            with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _strings(self, name):
+        return _decode_strings(
+            self._array(f"{name}.bytes.npy"), self._array(f"{name}.offsets.npy"), self._array(f"{name}.nulls.npy")
+        )
+
+    def _string_column(self, name):
+        # Без pyarrow строки декодируются в список — это уже частная копия процесса
+        if pa is None:
+            return self._strings(name)
+        return _arrow_strings(
+            self._array(f"{name}.bytes.npy"), self._array(f"{name}.offsets.npy"), self._array(f"{name}.nulls.npy")
+        )
+
+    def frame(self):
+        # copy=False: колонки кадра — представления над файлами артефакта, а не копии
+        return pd.DataFrame(
+            {name: self.columns[name] for name in (c['name'] for c in self.manifest['columns'])}, copy=False
+        )
+
+
+def open_artifact(directory=DEFAULT_DIR):
+    # Открывает уже собранный артефакт без проверки хэша CSV
+    directory = os.path.realpath(directory)
+    return Artifact(directory, read_manifest(directory))
+
+
+def reopen_artifact(source):
+    kind, location = source
+    if kind == 'shared':
+        from shared import SharedArtifact
+        return SharedArtifact(location)
+    return open_artifact(location)
+
+
+def load_artifact(csv_path=DEFAULT_CSV, directory=DEFAULT_DIR):
+    # Пересобирает артефакт, если его нет, сменилась версия формата или хэш CSV.
+    # После ожидания блокировки проверка повторяется: артефакт мог собрать другой процесс
+    if is_stale(csv_path, directory):
+        with _build_lock(directory):
+            if is_stale(csv_path, directory):
+                _build_artifact(csv_path, directory)
+    return open_artifact(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сборка предвычисленного артефакта каталога книг")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--out", default=DEFAULT_DIR)
+    parser.add_argument("--force", action="store_true", help="пересобрать даже если CSV не менялся")
+    args = parser.parse_args()
+
+    if args.force or is_stale(args.csv, args.out):
+        manifest = build_artifact(args.csv, args.out)
+        print(f"Артефакт собран: {manifest['rows']} книг за {manifest['build_seconds']} с -> {args.out}")
+        skipped = manifest['load_report']['skipped_lines']
+        if skipped:
+            print(f"Пропущено повреждённых строк CSV: {len(skipped)} "
+                  f"({', '.join(str(item['line']) for item in skipped[:20])})")
+        invalid = manifest['load_report']['invalid_ids']
+        if invalid:
+            print(f"Отброшено строк с неверным bookID: {len(invalid)} ({', '.join(map(str, invalid[:20]))})")
+    else:
+        print(f"Артефакт {args.out} актуален")
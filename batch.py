@@ -0,0 +1,80 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifact import DEFAULT_CSV, DEFAULT_DIR, load_artifact
+from recommender import BookRecommender
+
+# Пакетный расчёт рекомендаций без Streamlit, результат — JSONL в stdout или файл:
+#   python batch.py --by title --all -n 10 --out recommendations.jsonl
+
+
+def to_jsonable(value):
+    if isinstance(value, (np.float32, np.float16)):
+        # Кратчайшая запись, однозначная для своей точности: 4.59, а не 4.590000152587891
+        value = float(np.format_float_positional(value))
+    elif isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat()
+    if value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def read_queries(args, recommender):
+    if args.all:
+        column = 'authors' if args.by == 'author' else 'title'
+        return recommender.df[column].drop_duplicates().tolist()
+    source = open(args.queries, encoding='utf-8') if args.queries != '-' else sys.stdin
+    with source:
+        return [line.strip() for line in source if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчёт рекомендаций в JSONL")
+    parser.add_argument("--by", choices=["title", "author", "hybrid", "tokens"], default="title")
+    parser.add_argument("-n", "--n-recommendations", type=int, default=5)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--all", action="store_true", help="все названия (или авторы) каталога")
+    group.add_argument("--queries", help="файл с запросами, по одному на строку; '-' — stdin")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--chunksize", type=int, default=64)
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--artifact", default=DEFAULT_DIR)
+    parser.add_argument("--out", default="-", help="файл результата; '-' — stdout")
+    args = parser.parse_args(argv)
+
+    recommender = BookRecommender.from_artifact(load_artifact(args.csv, args.artifact))
+    queries = read_queries(args, recommender)
+
+    started = time.perf_counter()
+    out = open(args.out, 'w', encoding='utf-8') if args.out != '-' else sys.stdout
+    try:
+        results = recommender.iter_recommendations(
+            queries, args.by, args.n_recommendations, args.workers, args.chunksize
+        )
+        for query, recommendations in zip(queries, results):
+            record = {
+                'query': query,
+                'by': args.by,
+                'recommendations': [
+                    {key: to_jsonable(value) for key, value in book.items()}
+                    for book in recommendations
+                ],
+            }
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(queries)} запросов за {elapsed:.1f} с ({len(queries) / max(elapsed, 1e-9):.0f} запросов/с)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
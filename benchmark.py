@@ -0,0 +1,315 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from analytics import compute_aggregates
+from artifact import DEFAULT_CSV
+from caching import QueryCache
+from loader import read_catalog
+from recommender import BookRecommender
+from results import Recommendations
+
+# Замеры производительности рекомендателя. Каждый размер каталога меряется
+# в отдельном процессе, чтобы пиковый RSS не смешивался между сценариями:
+#   python benchmark.py run --sizes base 100000 1000000 --out bench.json
+#   python benchmark.py compare old.json new.json --tolerance 0.15
+#   python benchmark.py alloc -n 10
+#   python benchmark.py agreement -n 10
+
+# Метрики, у которых рост — это регрессия; для остальных (qps) — падение
+LOWER_IS_BETTER = ('seconds', 'p50_ms', 'p95_ms', 'peak_rss_mb')
+HIGHER_IS_BETTER = ('qps',)
+
+
+def synthetic_catalog(source, rows, seed=0):
+    # Каталог нужного размера из строк books.csv: уникальные bookID и
+    # слегка изменённые названия, чтобы индексы не схлопывались на дубликатах
+    rng = np.random.default_rng(seed)
+    data = source.iloc[rng.integers(0, len(source), rows)].reset_index(drop=True)
+    words = pd.Series(" ".join(source['title'].astype(str)).split()).unique()
+    suffixes = rng.choice(words, size=rows)
+    keep = rng.random(rows) < 0.1
+    data['title'] = np.where(keep, data['title'], data['title'].astype(str) + " " + suffixes)
+    data['bookID'] = np.arange(1, rows + 1)
+    return data
+
+
+def latency(fn, queries):
+    timings = []
+    started = time.perf_counter()
+    for query in queries:
+        t = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - started
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'qps': round(len(queries) / elapsed, 1) if elapsed else None,
+        'count': len(queries),
+    }
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, {'seconds': round(time.perf_counter() - started, 4)}
+
+
+def peak_rss_mb():
+    # ru_maxrss — в килобайтах на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(csv_path, n_queries, n_recommendations, seed=0):
+    metrics = {}
+    data, metrics['load_data'] = timed(lambda: read_catalog(csv_path))
+    recommender, metrics['build'] = timed(lambda: BookRecommender(data))
+    # Кэш запросов отключён, иначе повторные запросы мерили бы LRU, а не поиск
+    recommender.cache = QueryCache(maxsize=0)
+    _, metrics['analytics'] = timed(lambda: compute_aggregates(data))
+
+    rnd = random.Random(seed)
+    titles = recommender.df['title'].tolist()
+    authors = recommender.df['authors'].tolist()
+    metrics['recommend_title'] = latency(
+        lambda q: recommender.recommend_books(q, 'title', n_recommendations),
+        [rnd.choice(titles) for _ in range(n_queries)]
+    )
+    metrics['recommend_author'] = latency(
+        lambda q: recommender.recommend_books(q, 'author', n_recommendations),
+        [rnd.choice(authors) for _ in range(n_queries)]
+    )
+    metrics['memory'] = {'peak_rss_mb': peak_rss_mb()}
+    metrics['rows'] = len(recommender.df)
+    return metrics
+
+
+def _legacy_dict(row, similarity):
+    return {
+        'bookID': row['bookID'], 'title': row['title'], 'authors': row['authors'],
+        'similarity': similarity, 'average_rating': row['average_rating'],
+        'publication_date': row.get('publication_date', 'N/A'),
+        'ratings_count': row.get('ratings_count', 0), 'num_pages': row.get('num_pages', 'N/A'),
+    }
+
+
+def legacy_all_rows(df, positions, scores):
+    # Исходная схема: словарь на каждую строку каталога через iterrows и сортировка
+    similarity = dict(zip(positions.tolist(), scores.tolist()))
+    rows = [_legacy_dict(row, similarity.get(i, 0.0)) for i, row in df.iterrows()]
+    rows.sort(key=lambda item: (item['similarity'], item['average_rating']), reverse=True)
+    return rows[:len(positions)]
+
+
+def legacy_top_n(df, positions, scores):
+    # Словари только для итоговых N, но через Series-строку df.iloc[pos] на каждую книгу
+    return [_legacy_dict(df.iloc[pos], float(score)) for pos, score in zip(positions, scores)]
+
+
+def columnar(df, positions, scores):
+    return Recommendations.take(df, positions, scores).records()
+
+
+# Варианты сборки результата: записи для карточек и DataFrame для графика Plotly
+ALLOC_VARIANTS = {
+    'legacy_all_rows': (legacy_all_rows, lambda df, p, s: pd.DataFrame(legacy_all_rows(df, p, s))),
+    'legacy_top_n': (legacy_top_n, lambda df, p, s: pd.DataFrame(legacy_top_n(df, p, s))),
+    'columnar': (columnar, lambda df, p, s: Recommendations.take(df, p, s).frame()),
+}
+
+
+def allocations(fn, df, results):
+    # Время на запрос (без трассировки) и память по tracemalloc: пик и число
+    # блоков, выделенных за вызов и ещё живых в момент пика
+    started = time.perf_counter()
+    for positions, scores in results:
+        fn(df, positions, scores)
+    elapsed = time.perf_counter() - started
+
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    try:
+        for positions, scores in results:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            result = fn(df, positions, scores)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            blocks.append(sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename')))
+            del result
+    finally:
+        tracemalloc.stop()
+    return {
+        'ms_per_query': round(elapsed * 1000 / len(results), 3),
+        'peak_kb': round(float(np.mean(peaks)) / 1024, 1),
+        'live_blocks': round(float(np.mean(blocks)), 1),
+    }
+
+
+def alloc(args):
+    recommender = BookRecommender(read_catalog(args.csv))
+    rnd = random.Random(args.seed)
+    titles = recommender.df['title'].tolist()
+    results = [recommender.search(rnd.choice(titles), 'title', args.n_recommendations) for _ in range(args.queries)]
+    report = {}
+    for name, (records, chart) in ALLOC_VARIANTS.items():
+        sample = results[:args.legacy_queries] if name == 'legacy_all_rows' else results
+        report[name] = {
+            'records': allocations(records, recommender.df, sample),
+            'records_and_chart': allocations(chart, recommender.df, sample),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def agreement(args):
+    # Насколько top-N быстрого режима 'ngram' совпадает с эталонным 'sequence'
+    # (difflib по всему каталогу) на случайных названиях и их началах
+    recommender = BookRecommender(read_catalog(args.csv))
+    rnd = random.Random(args.seed)
+    titles = recommender.df['title'].tolist()
+    queries = {
+        'title': [rnd.choice(titles) for _ in range(args.queries)],
+        'prefix': [rnd.choice(titles)[:12] for _ in range(args.queries)],
+    }
+    report = {}
+    for kind, values in queries.items():
+        overlaps = [recommender.title_index.agreement(query, recommender.ratings, args.n_recommendations) for query in values]
+        report[kind] = {
+            'mean': round(float(np.mean(overlaps)), 3),
+            'p10': round(float(np.percentile(overlaps, 10)), 3),
+            'queries': len(overlaps),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def run(args):
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'scenarios': {},
+    }
+    source = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            if size == 'base':
+                csv_path = args.csv
+            else:
+                if source is None:
+                    source = pd.read_csv(args.csv, on_bad_lines='skip')
+                csv_path = os.path.join(tmp, f"books_{size}.csv")
+                synthetic_catalog(source, int(size), args.seed).to_csv(csv_path, index=False)
+
+            command = [
+                sys.executable, os.path.abspath(__file__), "scenario", csv_path,
+                "--queries", str(args.queries), "-n", str(args.n_recommendations), "--seed", str(args.seed),
+            ]
+            print(f"[{size}] ...", file=sys.stderr)
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results['scenarios'][size] = json.loads(output)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)['scenarios']
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)['scenarios']
+
+    regressions = []
+    for scenario, stages in current.items():
+        for stage, values in stages.items():
+            old_values = baseline.get(scenario, {}).get(stage)
+            if not isinstance(values, dict) or not isinstance(old_values, dict):
+                continue
+            for metric, new in values.items():
+                old = old_values.get(metric)
+                if not old or new is None or metric not in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                    continue
+                change = (new - old) / old
+                worse = change > args.tolerance if metric in LOWER_IS_BETTER else change < -args.tolerance
+                mark = "РЕГРЕССИЯ" if worse else ""
+                print(f"{scenario:>10} {stage:<18} {metric:<12} {old:>12} -> {new:<12} {change:+.1%} {mark}")
+                if worse:
+                    regressions.append((scenario, stage, metric))
+
+    if regressions:
+        print(f"Найдено регрессий: {len(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк рекомендательной системы")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="прогнать сценарии и вывести JSON")
+    run_parser.add_argument("--csv", default=DEFAULT_CSV)
+    run_parser.add_argument("--sizes", nargs="+", default=["base", "100000", "1000000"],
+                            help="'base' — сам books.csv, число — синтетический каталог такого размера")
+    run_parser.add_argument("--queries", type=int, default=200)
+    run_parser.add_argument("-n", "--n-recommendations", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--out")
+
+    scenario_parser = commands.add_parser("scenario", help="один сценарий (запускается из run)")
+    scenario_parser.add_argument("csv")
+    scenario_parser.add_argument("--queries", type=int, default=200)
+    scenario_parser.add_argument("-n", "--n-recommendations", type=int, default=5)
+    scenario_parser.add_argument("--seed", type=int, default=0)
+
+    alloc_parser = commands.add_parser("alloc", help="память и время сборки результата: прежние словари против колонок")
+    alloc_parser.add_argument("--csv", default=DEFAULT_CSV)
+    alloc_parser.add_argument("--queries", type=int, default=200)
+    alloc_parser.add_argument("--legacy-queries", type=int, default=5, help="запросов для полного прохода iterrows")
+    alloc_parser.add_argument("-n", "--n-recommendations", type=int, default=10)
+    alloc_parser.add_argument("--seed", type=int, default=0)
+
+    agreement_parser = commands.add_parser("agreement", help="совпадение top-N режимов 'ngram' и 'sequence'")
+    agreement_parser.add_argument("--csv", default=DEFAULT_CSV)
+    agreement_parser.add_argument("--queries", type=int, default=100)
+    agreement_parser.add_argument("-n", "--n-recommendations", type=int, default=10)
+    agreement_parser.add_argument("--seed", type=int, default=0)
+
+    compare_parser = commands.add_parser("compare", help="сравнить два прогона и найти регрессии")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.15)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+    elif args.command == "alloc":
+        alloc(args)
+    elif args.command == "agreement":
+        agreement(args)
+    elif args.command == "scenario":
+        print(json.dumps(run_scenario(args.csv, args.queries, args.n_recommendations, args.seed)))
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    # Потокобезопасный LRU для результатов BookRecommender.recommend. Экземпляр
+    # рекомендателя общий для всех сессий Streamlit, поэтому нужен lock.
+    # Значения (results.Recommendations) неизменяемы и отдаются без копирования
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+class DiskCache:
+    # Ограниченный по размеру LRU на диске для уже закодированных графиков (PNG,
+    # JSON Plotly). Имя файла — хэш ключа, порядок вытеснения — время последнего
+    # обращения (mtime обновляется при попадании), поэтому кэш переживает
+    # перезапуск сервера. Ключ должен включать хэш данных (LiveCatalog.fingerprint)
+    def __init__(self, directory, max_bytes=64 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._items = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.size = sum(self._items.values())
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def filename(key, ext):
+        encoded = json.dumps(key, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')
+        return f"{hashlib.blake2b(encoded, digest_size=16).hexdigest()}.{ext}"
+
+    def get(self, key, ext='png'):
+        name = self.filename(key, ext)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                self.size -= self._items.pop(name, 0)
+            return None
+        with self._lock:
+            self.hits += 1
+            if name not in self._items:
+                # Файл записал другой процесс с тем же каталогом
+                self._items[name] = len(data)
+                self.size += len(data)
+            self._items.move_to_end(name)
+        return data
+
+    def put(self, key, data, ext='png'):
+        if len(data) > self.max_bytes:
+            return
+        name = self.filename(key, ext)
+        # Запись через временный файл: читатель не увидит недописанный PNG
+        fd, staging = tempfile.mkstemp(prefix=".tmp-", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(staging, os.path.join(self.directory, name))
+        except OSError:
+            if os.path.exists(staging):
+                os.remove(staging)
+            return
+        with self._lock:
+            self.size += len(data) - self._items.pop(name, 0)
+            self._items[name] = len(data)
+            self._evict()
+
+    def get_or_create(self, key, create, ext='png'):
+        # create() вызывается только при промахе и должен вернуть bytes
+        data = self.get(key, ext)
+        if data is None:
+            data = create()
+            self.put(key, data, ext)
+        return data
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._items:
+            name, size = self._items.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for name in self._items:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            self._items.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._items),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
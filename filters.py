@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from caching import QueryCache
+from instrumentation import span
+from similarity import Vocabulary
+from works import WorkIndex
+
+# Фильтры выдачи: язык и издатель — набор значений, объём, дата и число оценок —
+# диапазон [min, max] (None — без границы). Например:
+#   {'language_code': ['eng'], 'num_pages': (None, 400),
+#    'publication_date': ('2000-01-01', None), 'ratings_count': (1000, None)}
+
+CATEGORY_FILTERS = ('language_code', 'publisher')
+RANGE_FILTERS = ('num_pages', 'publication_date', 'ratings_count')
+
+
+def _bound(name, value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if name == 'publication_date':
+        return pd.Timestamp(value)
+    return float(value)
+
+
+def normalize_filters(filters=None):
+    # Хэшируемый ключ фильтров для кэшей; None — фильтров нет
+    if not filters:
+        return None
+    unknown = set(filters) - set(CATEGORY_FILTERS) - set(RANGE_FILTERS)
+    if unknown:
+        raise ValueError(f"Неизвестные фильтры: {', '.join(sorted(unknown))}")
+    key = []
+    for name in CATEGORY_FILTERS:
+        values = filters.get(name)
+        if values is None:
+            continue
+        values = (values,) if isinstance(values, str) else tuple(values)
+        key.append((name, tuple(sorted(set(values)))))
+    for name in RANGE_FILTERS:
+        bounds = filters.get(name)
+        if bounds is None:
+            continue
+        low, high = (_bound(name, value) for value in bounds)
+        if low is not None or high is not None:
+            key.append((name, (low, high)))
+    return tuple(key) or None
+
+
+class FilterIndex:
+    # Колонки каталога, отсортированные один раз: для категорий — списки позиций
+    # по каждому значению, для чисел и дат — отсортированные значения. Маска любого
+    # фильтра собирается из срезов этих массивов, готовые сочетания кэшируются.
+    # Если в каталоге есть work_id, в маске остаётся одно издание на произведение
+    def __init__(self, df, alive=None, cache_size=256):
+        self.rows = len(df)
+        self.cache = QueryCache(maxsize=cache_size)
+        self.works = None
+        if 'work_id' in df:
+            popularity = pd.to_numeric(df['ratings_count'], errors='coerce').fillna(0) if 'ratings_count' in df else np.zeros(len(df))
+            self.works = WorkIndex(df['work_id'].to_numpy(), popularity, alive)
+        self.categories = {}
+        for name in CATEGORY_FILTERS:
+            if name not in df:
+                continue
+            column = df[name]
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype('category')
+            codes = column.cat.codes.to_numpy()
+            order = np.argsort(codes, kind='stable')
+            offsets = np.searchsorted(codes[order], np.arange(len(column.cat.categories) + 1))
+            lookup = Vocabulary([str(value) for value in column.cat.categories])
+            self.categories[name] = (lookup, order, offsets)
+
+        self.ranges = {}
+        for name in RANGE_FILTERS:
+            if name not in df:
+                continue
+            column = df[name]
+            if name == 'publication_date':
+                column = pd.to_datetime(column, errors='coerce')
+            else:
+                column = pd.to_numeric(column, errors='coerce')
+            valid = np.flatnonzero(column.notna().to_numpy())
+            values = column.to_numpy()[valid]
+            order = np.argsort(values, kind='stable')
+            self.ranges[name] = (valid[order], values[order])
+
+    @classmethod
+    def from_state(cls, rows, state, work_ids=None, cache_size=256):
+        # Отсортированные массивы из артефакта (memory-mapped или в shared memory):
+        # процесс не держит своих копий порядка строк по каждой колонке
+        index = cls.__new__(cls)
+        index.rows = rows
+        index.cache = QueryCache(maxsize=cache_size)
+        index.works = None if state['works'] is None else WorkIndex.from_state(work_ids, state['works'])
+        index.categories = {
+            name: (Vocabulary(part['values'], part['value_hashes'], part['value_ids']), part['order'], part['offsets'])
+            for name, part in state['categories'].items()
+        }
+        index.ranges = {name: (part['positions'], part['values']) for name, part in state['ranges'].items()}
+        return index
+
+    def state(self):
+        categories = {}
+        for name, (lookup, order, offsets) in self.categories.items():
+            values, value_hashes, value_ids = lookup.state()
+            categories[name] = {
+                'values': list(values), 'value_hashes': value_hashes, 'value_ids': value_ids,
+                'order': order, 'offsets': offsets,
+            }
+        return {
+            'categories': categories,
+            'ranges': {name: {'positions': positions, 'values': values} for name, (positions, values) in self.ranges.items()},
+            'works': None if self.works is None else self.works.state(),
+        }
+
+    def mask(self, key):
+        # key — результат normalize_filters (None — без фильтров); маска только для чтения
+        if key is None:
+            return None if self.works is None else self.works.canonical
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        with span("filters.mask", filters=len(key)):
+            mask = np.ones(self.rows, dtype=bool)
+            for name, value in key:
+                mask &= self._category_mask(name, value) if name in CATEGORY_FILTERS else self._range_mask(name, value)
+            if self.works is not None:
+                mask = self.works.representatives(mask)
+        mask.flags.writeable = False
+        self.cache.put(key, mask)
+        return mask
+
+    def _category_mask(self, name, values):
+        mask = np.zeros(self.rows, dtype=bool)
+        if name not in self.categories:
+            return mask
+        lookup, order, offsets = self.categories[name]
+        for value in values:
+            code = lookup.get(str(value))
+            if code is not None:
+                mask[order[offsets[code]:offsets[code + 1]]] = True
+        return mask
+
+    def _range_mask(self, name, bounds):
+        mask = np.zeros(self.rows, dtype=bool)
+        if name not in self.ranges:
+            return mask
+        positions, values = self.ranges[name]
+        low, high = bounds
+        if name == 'publication_date':
+            low = None if low is None else low.to_datetime64()
+            high = None if high is None else high.to_datetime64()
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        end = len(values) if high is None else np.searchsorted(values, high, side='right')
+        mask[positions[start:end]] = True
+        return mask
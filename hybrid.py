@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# Гибридная похожесть книги-образца на весь каталог: взвешенная сумма признаков,
+# посчитанная одним проходом по заранее подготовленным массивам
+
+DEFAULT_WEIGHTS = {
+    'title': 0.45,
+    'author': 0.25,
+    'publisher': 0.05,
+    'language': 0.05,
+    'pages': 0.05,
+    'popularity': 0.15,
+}
+
+
+def normalize_weights(weights=None):
+    merged = dict(DEFAULT_WEIGHTS)
+    if weights:
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Неизвестные признаки гибридного режима: {', '.join(sorted(unknown))}")
+        merged.update(weights)
+    return {name: float(value) for name, value in merged.items()}
+
+
+def _codes(column):
+    # Коды категорий: равенство издателя/языка — сравнение int32, а не строк
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    return column.cat.codes.to_numpy().astype(np.int32)
+
+
+class HybridFeatures:
+    # Признаки каталога, не зависящие от запроса; строятся один раз на ревизию каталога
+    def __init__(self, df):
+        self.publisher = _codes(df['publisher'])
+        self.language = _codes(df['language_code'])
+        pages = pd.to_numeric(df['num_pages'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+        self.log_pages = np.log1p(np.maximum(pages, 0))
+
+        ratings = pd.to_numeric(df['ratings_count'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+        reviews = pd.to_numeric(df['text_reviews_count'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+        popularity = np.log1p(np.maximum(ratings, 0)) + 0.5 * np.log1p(np.maximum(reviews, 0))
+        peak = popularity.max() if len(popularity) else 0
+        self.popularity = popularity / peak if peak > 0 else popularity
+
+    def __len__(self):
+        return len(self.publisher)
+
+    def score(self, seed, title_scores, author_rows, author_scores, weights):
+        # seed — позиция книги-образца или None для свободного текста (тогда
+        # признаки, требующие образца, равны нулю)
+        with span("hybrid.score"):
+            scores = weights['title'] * title_scores + weights['popularity'] * self.popularity
+            if seed is not None:
+                if weights['author'] and len(author_rows):
+                    author = np.zeros(len(self), dtype=np.float64)
+                    author[author_rows] = author_scores
+                    scores += weights['author'] * author
+                # Код -1 — пропуск: пустой издатель не считается совпадением
+                if self.publisher[seed] >= 0:
+                    scores += weights['publisher'] * (self.publisher == self.publisher[seed])
+                if self.language[seed] >= 0:
+                    scores += weights['language'] * (self.language == self.language[seed])
+                scores += weights['pages'] / (1.0 + np.abs(self.log_pages - self.log_pages[seed]))
+            return scores
+
+    def profile_score(self, seeds, title_scores, author_scores, weights):
+        # Несколько книг-образцов (история чтения): доля образцов с тем же издателем
+        # и языком, близость объёма к среднему по образцам. author_scores — уже
+        # плотный массив по всему каталогу
+        with span("hybrid.profile"):
+            scores = weights['title'] * title_scores + weights['popularity'] * self.popularity
+            if len(seeds) == 0:
+                return scores
+            scores += weights['author'] * author_scores
+            for codes, name in ((self.publisher, 'publisher'), (self.language, 'language')):
+                seed_codes = codes[seeds]
+                share = np.bincount(seed_codes[seed_codes >= 0], minlength=codes.max() + 1) / len(seeds)
+                scores += weights[name] * np.where(codes >= 0, share[np.maximum(codes, 0)], 0.0)
+            scores += weights['pages'] / (1.0 + np.abs(self.log_pages - self.log_pages[seeds].mean()))
+            return scores
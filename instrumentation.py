@@ -0,0 +1,130 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Лёгкие тайминги этапов: структурированный лог, счётчики и гистограммы в
+# текстовом формате Prometheus, плюс список этапов текущего прогона скрипта
+# для отладочной панели в Streamlit
+
+logger = logging.getLogger("nextbook.timing")
+
+# Границы корзин гистограммы в секундах
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_trace = contextvars.ContextVar("nextbook_trace", default=None)
+
+
+class Metrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(self.buckets)}
+            entry['count'] += 1
+            entry['sum'] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: dict(entry, buckets=list(entry['buckets'])) for stage, entry in self._stages.items()}
+
+    def render_prometheus(self):
+        lines = [
+            "# HELP nextbook_stage_calls_total Number of times a stage ran.",
+            "# TYPE nextbook_stage_calls_total counter",
+        ]
+        stages = self.snapshot()
+        for stage, entry in sorted(stages.items()):
+            lines.append(f'nextbook_stage_calls_total{{stage="{stage}"}} {entry["count"]}')
+
+        lines += [
+            "# HELP nextbook_stage_duration_seconds Stage duration.",
+            "# TYPE nextbook_stage_duration_seconds histogram",
+        ]
+        for stage, entry in sorted(stages.items()):
+            for bound, count in zip(self.buckets, entry['buckets']):
+                lines.append(f'nextbook_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'nextbook_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'nextbook_stage_duration_seconds_sum{{stage="{stage}"}} {entry["sum"]:.6f}')
+            lines.append(f'nextbook_stage_duration_seconds_count{{stage="{stage}"}} {entry["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(stage, **fields):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe(stage, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, seconds * 1000))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'event': 'span', 'stage': stage, 'ms': round(seconds * 1000, 3), **fields},
+                                   ensure_ascii=False, default=str))
+
+
+def start_trace():
+    # Новый список этапов для текущего прогона (каждая сессия Streamlit — свой поток)
+    trace = []
+    _current_trace.set(trace)
+    return trace
+
+
+def write_metrics(path):
+    # Атомарная запись, чтобы сборщик метрик не прочитал половину файла
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(metrics.render_prometheus())
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    # Локальный эндпоинт /metrics в фоновом потоке; повторный вызов ничего не делает
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,226 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from artifact import DEFAULT_CSV, DEFAULT_DIR, csv_hash, load_artifact
+from instrumentation import span
+from loader import LoadReport, read_catalog
+from recommender import BookRecommender
+
+# Каталог, который живёт дольше одного прогона приложения: рекомендатель и
+# агрегаты аналитики правятся на месте при добавлении, изменении и удалении
+# книг, а дописанные в books.csv строки подхватываются без перезапуска
+
+logger = logging.getLogger(__name__)
+
+
+class LiveCatalog:
+    def __init__(self, csv_path=DEFAULT_CSV, directory=DEFAULT_DIR, ann_min_rows=None, shared=None):
+        # shared — имя каталога, опубликованного в shared memory (python shared.py publish)
+        self.csv_path = csv_path
+        self.directory = directory
+        self.ann_min_rows = ann_min_rows
+        self.shared = shared
+        self.generation = 0
+        self.recommender = None
+        self.watcher = None
+        # Интервал фонового сжатия; None — каталог ещё не запущен (start)
+        self.compaction_interval = None
+        self._aggregates = None
+        self._aggregates_version = None
+        self._fingerprint = None
+        self._lock = threading.RLock()
+        self.offset = self._load()
+
+    def _open_artifact(self):
+        if self.shared:
+            from shared import SharedArtifact
+
+            artifact = SharedArtifact(self.shared)
+            if artifact.manifest.get('csv_sha256') == csv_hash(self.csv_path):
+                return artifact
+            logger.warning("Каталог в shared memory '%s' не соответствует %s, загружаю с диска",
+                           self.shared, self.csv_path)
+        return load_artifact(self.csv_path, self.directory)
+
+    def _load(self):
+        artifact = self._open_artifact()
+        with span("build_recommender"):
+            recommender = BookRecommender.from_artifact(artifact)
+            if self.ann_min_rows and len(recommender.df) >= self.ann_min_rows:
+                recommender.enable_ann()
+
+        with self._lock:
+            if self.recommender is not None:
+                self.recommender.stop_compaction()
+            if self.compaction_interval is not None:
+                # Перезагрузка после start(): сжатие переходит на новый рекомендатель
+                recommender.start_compaction(self.compaction_interval)
+            self.artifact = artifact
+            self.recommender = recommender
+            self.generation += 1
+            self._aggregates = None
+        return artifact.manifest.get('csv_size', os.path.getsize(self.csv_path))
+
+    @property
+    def version(self):
+        # Ключ для кэшей Streamlit: меняется при полной перезагрузке и при каждой правке
+        return (self.generation, self.recommender.revision)
+
+    @property
+    def fingerprint(self):
+        # Ключ содержимого для дискового кэша графиков: в отличие от version, один и
+        # тот же в разных процессах и после перезапуска. Хэш CSV из манифеста, после
+        # правок каталога — ещё и хэш текущих строк
+        with self._lock:
+            version = self.version
+            if self._fingerprint is None or self._fingerprint[0] != version:
+                digest = self.artifact.manifest['csv_sha256'][:16]
+                if self.recommender.revision:
+                    rows = pd.util.hash_pandas_object(self.books(), index=False).to_numpy()
+                    digest += "-" + hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+                self._fingerprint = (version, digest)
+            return self._fingerprint[1]
+
+    def books(self):
+        return self.recommender.books()
+
+    def aggregates(self):
+        with self._lock:
+            if self._aggregates is None or self._aggregates_version != self.version:
+                # analytics (matplotlib, seaborn, wordcloud) грузится только для вкладки аналитики
+                from analytics import compute_aggregates
+
+                self._aggregates = compute_aggregates(self.recommender.books())
+                self._aggregates_version = self.version
+            return self._aggregates
+
+    def _patch_aggregates(self, before, added=None, removed=None):
+        # Если агрегаты соответствовали каталогу до правки — правим их на разницу,
+        # иначе они пересчитаются целиком при следующем обращении
+        if self._aggregates is not None and self._aggregates_version == before:
+            from analytics import update_aggregates
+
+            self._aggregates = update_aggregates(self._aggregates, added, removed)
+            self._aggregates_version = self.version
+
+    def add_books(self, data):
+        with self._lock:
+            before = self.version
+            added = self.recommender.add_books(data)
+            self._patch_aggregates(before, added=added)
+            return added
+
+    def update_books(self, data):
+        with self._lock:
+            before = self.version
+            added, removed = self.recommender.update_books(data)
+            self._patch_aggregates(before, added=added, removed=removed)
+            return added, removed
+
+    def remove_books(self, book_ids):
+        with self._lock:
+            before = self.version
+            removed = self.recommender.remove_books(book_ids)
+            self._patch_aggregates(before, removed=removed)
+            return removed
+
+    def reload(self):
+        # Полная перезагрузка: файл изменён не дописыванием в конец
+        self.offset = self._load()
+        return self.offset
+
+    def start(self, poll_interval=2.0, compaction_interval=300.0):
+        with self._lock:
+            self.compaction_interval = compaction_interval
+            self.recommender.start_compaction(compaction_interval)
+        if self.watcher is None:
+            self.watcher = CatalogWatcher(self)
+            self.watcher.start(poll_interval)
+        return self
+
+
+class CatalogWatcher:
+    # Следит за books.csv: новые полные строки в конце файла добавляются через
+    # LiveCatalog.add_books, любое другое изменение вызывает LiveCatalog.reload
+    SIGNATURE_BYTES = 256
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.path = catalog.csv_path
+        self.report = LoadReport()
+        self._thread = None
+        self._stop = threading.Event()
+        self._reset(catalog.offset)
+
+    def _reset(self, offset):
+        self.offset = offset
+        with open(self.path, 'rb') as f:
+            self.header = f.readline()
+            # Число строк файла до offset: номера пропущенных строк хвоста — от начала файла
+            f.seek(0)
+            self.lines = f.read(offset).count(b'\n')
+            start = max(0, offset - self.SIGNATURE_BYTES)
+            f.seek(start)
+            self.signature = f.read(offset - start)
+
+    def poll(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return None
+        if size == self.offset:
+            return None
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset - len(self.signature))
+            prefix = f.read(len(self.signature))
+            if size < self.offset or prefix != self.signature:
+                self._reset(self.catalog.reload())
+                return None
+            f.seek(self.offset)
+            tail = f.read(size - self.offset)
+
+        end = tail.rfind(b'\n')
+        if end < 0:
+            # Последняя строка ещё дописывается
+            return None
+        appended = tail[:end + 1]
+        skipped, invalid = len(self.report.skipped_lines), len(self.report.invalid_ids)
+        frame = read_catalog(io.BytesIO(self.header + appended), report=self.report)
+        # В буфере строка 1 — заголовок, строка 2 — первая дописанная
+        self.report.skipped_lines[skipped:] = [
+            (self.lines + line - 1, reason) for line, reason in self.report.skipped_lines[skipped:]
+        ]
+        if len(self.report.skipped_lines) > skipped or len(self.report.invalid_ids) > invalid:
+            logger.warning("В дописанных строках %s пропущены повреждённые: строки %s, bookID %s", self.path,
+                           [line for line, _ in self.report.skipped_lines[skipped:]], self.report.invalid_ids[invalid:])
+        if len(frame):
+            self.catalog.add_books(frame)
+        self.offset += len(appended)
+        self.lines += appended.count(b'\n')
+        self.signature = (self.signature + appended)[-self.SIGNATURE_BYTES:]
+        return frame
+
+    def start(self, interval=2.0):
+        if self._thread is not None:
+            return self._thread
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll()
+                except Exception:
+                    logger.exception("Не удалось применить изменения %s", self.path)
+
+        self._thread = threading.Thread(target=loop, name="catalog-watcher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
@@ -0,0 +1,146 @@
+import re
+import warnings
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Потоковая загрузка books.csv частями с явной схемой: компактные числовые типы,
+# category для повторяющихся строк, ISBN как строки и учёт пропущенных строк
+
+CHUNK_SIZE = 50_000
+
+INT_COLUMNS = ('bookID', 'num_pages', 'ratings_count', 'text_reviews_count')
+FLOAT_COLUMNS = ('average_rating',)
+CATEGORY_COLUMNS = ('language_code', 'publisher')
+DATE_FORMAT = '%m/%d/%Y'
+
+_SKIPPED = re.compile(r"Skipping line (\d+): (.*)")
+# Колонки, которые вычисляются из title при каждой нормализации
+DERIVED_COLUMNS = ('clean_title', 'series', 'series_number')
+# Скобки в конце названия (допускается одна вложенная пара) и номер в них:
+# "Harry Potter and the Half-Blood Prince (Harry Potter  #6)", "(Aubrey/Maturin Book 10)"
+_SERIES = re.compile(r"\(((?:[^()]|\([^()]*\))*)\)\s*$")
+_SERIES_NUMBER = re.compile(r"\s*,?\s*(?:#|\bBook\s+)(\d+(?:\.\d+)?)\b.*$", re.IGNORECASE)
+
+
+class LoadReport:
+    def __init__(self):
+        self.rows = 0
+        self.dropped_rows = 0
+        # Номера строк файла (с единицы) и причина пропуска от парсера
+        self.skipped_lines = []
+        # Значения bookID, которые не разобрались как целое число (строки отброшены)
+        self.invalid_ids = []
+
+    def add_parser_warnings(self, caught):
+        for warning in caught:
+            if not issubclass(warning.category, pd.errors.ParserWarning):
+                warnings.warn_explicit(warning.message, warning.category, warning.filename, warning.lineno)
+                continue
+            for line, reason in _SKIPPED.findall(str(warning.message)):
+                self.skipped_lines.append((int(line), reason.strip()))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'dropped_rows': self.dropped_rows,
+            'skipped_lines': [{'line': line, 'reason': reason} for line, reason in self.skipped_lines],
+            'invalid_ids': self.invalid_ids,
+        }
+
+
+def normalize_header(columns):
+    # В books.csv заголовок '  num_pages' с ведущими пробелами
+    return [str(column).strip() for column in columns]
+
+
+def split_titles(titles):
+    # clean_title — название без скобок (как раньше), series и series_number —
+    # серия и номер из последних скобок; без скобок — пропуски
+    clean = titles.str.replace(r'\(.*\)', '', regex=True).str.strip()
+    inner = titles.str.extract(_SERIES, expand=False)
+    number = pd.to_numeric(inner.str.extract(_SERIES_NUMBER, expand=False), errors='coerce').astype('float32')
+    series = inner.str.replace(_SERIES_NUMBER, '', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+    return clean, series.where(series != ''), number
+
+
+def normalize_chunk(chunk, report=None):
+    chunk.columns = normalize_header(chunk.columns)
+    chunk['title'] = chunk['title'].str.strip()
+    chunk['authors'] = chunk['authors'].str.strip()
+    for column in FLOAT_COLUMNS:
+        chunk[column] = pd.to_numeric(chunk[column], errors='coerce').astype('float32')
+
+    before = len(chunk)
+    chunk = chunk.dropna(subset=['title', 'authors', 'average_rating'])
+    if report is not None:
+        report.dropped_rows += before - len(chunk)
+
+    if 'bookID' in chunk:
+        # Неразобранный bookID не заменяется нулём: такая книга совпала бы с другими
+        ids = pd.to_numeric(chunk['bookID'], errors='coerce')
+        invalid = (ids.isna() | (ids != ids.round())).to_numpy()
+        if invalid.any():
+            if report is not None:
+                report.dropped_rows += int(invalid.sum())
+                report.invalid_ids.extend(None if pd.isna(value) else value for value in chunk['bookID'][invalid])
+            chunk = chunk[~invalid]
+
+    for column in INT_COLUMNS:
+        if column in chunk:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce').fillna(0).astype('int32')
+    if 'publication_date' in chunk:
+        chunk['publication_date'] = pd.to_datetime(chunk['publication_date'], format=DATE_FORMAT, errors='coerce')
+    for column in CATEGORY_COLUMNS:
+        if column in chunk:
+            chunk[column] = chunk[column].astype('category')
+    chunk['clean_title'], chunk['series'], chunk['series_number'] = split_titles(chunk['title'])
+    return chunk
+
+
+def iter_catalog(csv_path, chunksize=CHUNK_SIZE, report=None):
+    # Нормализованные части каталога по мере чтения: файл целиком в память не грузится.
+    # Все колонки читаются как строки, поэтому ISBN не превращаются в числа.
+    # Заголовок читается как обычная строка (header=None): иначе pandas по лишнему
+    # полю в первой строке данных сделал бы колонку 0 индексом и сдвинул все колонки,
+    # а с index_col=False — молча обрезал бы такие строки по всему файлу
+    reader = pd.read_csv(csv_path, dtype=str, header=None, index_col=False, chunksize=chunksize, on_bad_lines='warn')
+    columns = None
+    while True:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                break
+        if report is not None:
+            report.add_parser_warnings(caught)
+        if columns is None:
+            columns = chunk.iloc[0].tolist()
+            chunk = chunk.iloc[1:]
+        chunk.columns = columns
+        chunk = normalize_chunk(chunk.reset_index(drop=True), report)
+        if report is not None:
+            report.rows += len(chunk)
+        yield chunk
+
+
+def concat_chunks(chunks):
+    # pd.concat превращает category с разными категориями в object, поэтому
+    # категориальные колонки склеиваются через union_categoricals
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    columns = list(chunks[0].columns)
+    categorical = [
+        column for column in CATEGORY_COLUMNS
+        if column in columns and all(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks)
+    ]
+    data = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for column in categorical:
+        data[column] = union_categoricals([chunk[column] for chunk in chunks])
+    return data[columns]
+
+
+def read_catalog(csv_path, chunksize=CHUNK_SIZE, report=None):
+    return concat_chunks(iter_catalog(csv_path, chunksize, report))
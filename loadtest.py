@@ -0,0 +1,324 @@
+import argparse
+import gc
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from artifact import DEFAULT_CSV
+from benchmark import peak_rss_mb
+from loader import read_catalog
+
+# Нагрузочный тест приложения без браузера: N сессий одновременно выполняют
+# случайные действия — поиск по названию, автору, смешанный режим, слова, история,
+# «Показать ещё». Сессии живут в одном процессе, как на сервере Streamlit, и делят
+# его кэши (cache_resource, кэш запросов, дисковый кэш графиков). Два драйвера:
+#   direct  — потоки вызывают функции BookRecommender.py тем же путём, что и прогон
+#             скрипта (подсказки, страницы выдачи, HTML карточек, графики)
+#   apptest — полный прогон скрипта через streamlit.testing AppTest. AppTest
+#             подменяет глобальный Runtime на время прогона, поэтому прогоны разных
+#             сессий идут по очереди: это стоимость одного потока скрипта
+#   python loadtest.py --sessions 16 --rounds 3 --actions 5 --out load.json
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BookRecommender.py")
+MODES = {
+    'title': "Название книги",
+    'author': "Автор",
+    'hybrid': "Смешанный режим",
+    'tokens': "Слова в названии",
+    'history': "По истории чтения",
+}
+# Доли действий в смеси; 'more' — «Показать ещё» по текущему запросу сессии
+MIX = {'title': 0.35, 'author': 0.2, 'hybrid': 0.1, 'tokens': 0.15, 'history': 0.1, 'more': 0.1}
+RECOMMENDATION_COUNTS = (5, 10, 20, 50, 100)
+# Доля действий с фильтром «Не меньше оценок»
+FILTERED_SHARE = 0.2
+MIN_RATINGS = 1000
+_WORD = re.compile(r"[^\W\d_]{3,}")
+
+
+def current_rss_mb():
+    # Текущий, а не пиковый RSS: рост памяти между раундами; вне Linux — пиковый
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def query_mix(data, count, rnd):
+    # Действия сессии: начало названия, как его набирает пользователь, фамилия
+    # автора, слова или серия с номером, несколько прочитанных книг
+    titles = data['clean_title'].astype(str).tolist()
+    authors = data['authors'].astype(str).tolist()
+    series = data[data['series'].notna() & data['series_number'].notna()]
+    book_ids = data['bookID'].tolist()
+    actions = []
+    for kind in rnd.choices(list(MIX), weights=list(MIX.values()), k=count):
+        action = {'kind': kind, 'n': rnd.choice(RECOMMENDATION_COUNTS)}
+        action['min_ratings'] = MIN_RATINGS if rnd.random() < FILTERED_SHARE else 0
+        if kind in ('title', 'hybrid'):
+            words = rnd.choice(titles).lower().split()
+            action['text'] = " ".join(words[:rnd.randint(1, 3)])
+        elif kind == 'author':
+            action['text'] = rnd.choice(authors).split('/')[0].split()[-1]
+        elif kind == 'tokens':
+            if len(series) and rnd.random() < 0.3:
+                row = series.iloc[rnd.randrange(len(series))]
+                action['text'] = f"{row['series']} #{row['series_number']:g}"
+            else:
+                words = _WORD.findall(rnd.choice(titles).lower()) or ["book"]
+                action['text'] = " ".join(rnd.sample(words, min(len(words), 2)))
+        elif kind == 'history':
+            action['ids'] = rnd.sample(book_ids, rnd.randint(2, 6))
+        actions.append(action)
+    return actions
+
+
+def _by_label(elements, label):
+    return next((element for element in elements if element.label == label), None)
+
+
+class DirectSession:
+    # session_state — обычный словарь; тяжёлые функции приложения общие для потоков
+    def __init__(self, app):
+        self.app = app
+        self.state = {}
+        self.timings = []
+        self.errors = 0
+
+    def open(self):
+        self._timed('open', self._common)
+
+    def perform(self, action):
+        if action['kind'] == 'more' and not self.state.get('more'):
+            # Кнопки «Показать ещё» нет: выдача короче страницы или уже показана целиком
+            return
+        self._timed(action['kind'], lambda: self._rerun(action))
+
+    def _timed(self, kind, fn):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            self.errors += 1
+        self.timings.append((kind, (time.perf_counter() - started) * 1000))
+
+    def _common(self):
+        version = self.app.dataset_version()
+        self.app.load_data(version)
+        self.app.get_filter_options(version)
+        return version, self.app.get_search_indexes(version)
+
+    def _rerun(self, action):
+        app = self.app
+        version, indexes = self._common()
+        kind = action['kind']
+        if kind == 'more':
+            self.state['shown'] += app.PAGE_SIZE
+        else:
+            if kind == 'history':
+                query = list(action['ids'])
+            elif kind == 'tokens':
+                query = action['text']
+            else:
+                options = indexes['authors' if kind == 'author' else 'title'].search(action['text'], app.TYPEAHEAD_LIMIT)
+                if not options:
+                    return
+                query = options[0]
+            self.state['request'] = {
+                'query': query, 'by': kind, 'n': action['n'],
+                'weights': dict(app.DEFAULT_WEIGHTS) if kind in ('hybrid', 'history') else None,
+                'filters': {'ratings_count': (action['min_ratings'], None)} if action['min_ratings'] else {},
+            }
+            self.state['shown'] = app.PAGE_SIZE
+        request = self.state['request']
+        shown = min(self.state['shown'], request['n'])
+        pages = app.fetch_pages(app.get_recommender(), request, shown)
+        self.state['more'] = sum(len(page) for page in pages) == shown and shown < request['n']
+        if not len(pages[0]):
+            return
+        # Сессия держит то, что держал бы браузерный прогон: HTML страниц и фигуру
+        self.state['cards'] = [app.cards_html(page, i * app.PAGE_SIZE) for i, page in enumerate(pages)]
+        self.state['chart'] = app.ratings_chart(request, shown, pages)
+        app.get_analytics_images(version)
+
+
+_APPTEST_LOCK = threading.Lock()
+
+
+class AppTestSession:
+    # Одна сессия браузера: свой AppTest со своим session_state
+    def __init__(self, timeout=120):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP, default_timeout=timeout)
+        self.mode = None
+        self.timings = []
+        self.errors = 0
+
+    def _run(self, kind, element=None):
+        with _APPTEST_LOCK:
+            started = time.perf_counter()
+            try:
+                (element or self.app).run()
+            except Exception:
+                # Таймаут или падение раннера — считаем ошибкой и продолжаем
+                self.errors += 1
+            else:
+                self.errors += len(self.app.exception)
+            self.timings.append((kind, (time.perf_counter() - started) * 1000))
+
+    def open(self):
+        self._run('open')
+
+    def perform(self, action):
+        kind = action['kind']
+        if kind == 'more':
+            button = _by_label(self.app.main.button, "Показать ещё")
+            if button is not None:
+                self._run(kind, button.click())
+            return
+        if self.mode != kind:
+            self._run(kind, self.app.sidebar.radio[0].set_value(MODES[kind]))
+            self.mode = kind
+        if kind == 'history':
+            self.app.session_state['history'] = list(action['ids'])
+        else:
+            key = {'title': "title_query", 'hybrid': "title_query", 'author': "authors_query"}.get(kind, "tokens_query")
+            self._run(kind, self.app.sidebar.text_input(key=key).input(action['text']))
+        # Значения виджетов без прогона уходят в следующий прогон вместе с кнопкой
+        slider = _by_label(self.app.sidebar.slider, "Количество рекомендаций:")
+        if slider is not None and slider.value != action['n']:
+            slider.set_value(action['n'])
+        min_ratings = _by_label(self.app.sidebar.number_input, "Не меньше оценок:")
+        if min_ratings is not None and min_ratings.value != action['min_ratings']:
+            min_ratings.set_value(action['min_ratings'])
+        button = _by_label(self.app.sidebar.button, "Получить рекомендации")
+        if button is not None and not button.disabled:
+            self._run(kind, button.click())
+
+
+def percentiles(timings):
+    if not timings:
+        return {'count': 0}
+    return {
+        'count': len(timings),
+        'p50_ms': round(float(np.percentile(timings, 50)), 1),
+        'p95_ms': round(float(np.percentile(timings, 95)), 1),
+        'p99_ms': round(float(np.percentile(timings, 99)), 1),
+        'max_ms': round(float(max(timings)), 1),
+    }
+
+
+def run_load(csv_path=DEFAULT_CSV, sessions=8, rounds=3, actions=5, seed=0, driver='direct', timeout=120):
+    # Раунд — все сессии одновременно выполняют по actions действий; RSS меряется
+    # между раундами, поэтому рост на сессию за раунд показывает утечки. Прогрев
+    # (загрузка каталога, первая отрисовка аналитики) в задержки не входит
+    rss_start = current_rss_mb()
+    if driver == 'direct':
+        import BookRecommender as app
+
+        new_session = lambda: DirectSession(app)
+    else:
+        new_session = lambda: AppTestSession(timeout)
+    started = time.perf_counter()
+    warmup = new_session()
+    warmup.open()
+    warmup.perform({'kind': 'title', 'text': "the", 'n': 5, 'min_ratings': 0})
+    warmup_seconds = time.perf_counter() - started
+    warmup_errors = warmup.errors
+    warmup = None
+    gc.collect()
+    rss_warm = current_rss_mb()
+
+    rnd = random.Random(seed)
+    data = read_catalog(csv_path)
+    plans = [query_mix(data, rounds * actions, random.Random(rnd.random())) for _ in range(sessions)]
+    data = None
+    clients = [new_session() for _ in range(sessions)]
+    rss_rounds = []
+    elapsed = 0.0
+    for round_index in range(rounds):
+        def drive(client, plan):
+            if round_index == 0:
+                client.open()
+            for action in plan[round_index * actions:(round_index + 1) * actions]:
+                client.perform(action)
+
+        threads = [threading.Thread(target=drive, args=pair) for pair in zip(clients, plans)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed += time.perf_counter() - started
+        gc.collect()
+        rss_rounds.append(current_rss_mb())
+
+    timings = [timing for client in clients for timing in client.timings]
+    reruns = [ms for kind, ms in timings if kind != 'open']
+    by_kind = {kind: percentiles([ms for other, ms in timings if other == kind]) for kind in ['open', *MIX]}
+    return {
+        'meta': {
+            'driver': driver, 'sessions': sessions, 'rounds': rounds, 'actions': actions, 'seed': seed,
+            'cpu_count': os.cpu_count(), 'python': sys.version.split()[0],
+        },
+        'warmup_seconds': round(warmup_seconds, 2),
+        'throughput': {
+            'seconds': round(elapsed, 2),
+            'actions_per_s': round(sessions * rounds * actions / elapsed, 2) if elapsed else None,
+            'reruns_per_s': round(len(timings) / elapsed, 2) if elapsed else None,
+        },
+        'latency': dict(percentiles(reruns), by_action=by_kind),
+        'errors': warmup_errors + sum(client.errors for client in clients),
+        'memory': {
+            'rss_start_mb': rss_start,
+            'rss_warm_mb': rss_warm,
+            'rss_after_round_mb': rss_rounds,
+            # Сессия после первого раунда: session_state, дерево элементов, свои запросы
+            'per_session_mb': round((rss_rounds[0] - rss_warm) / sessions, 2) if rss_rounds else None,
+            # Рост на сессию за раунд: пока заполняются общие кэши (запросов — до
+            # 1024 записей), он положительный; не затухающий на длинном прогоне — утечка
+            'growth_per_session_round_mb': (
+                round((rss_rounds[-1] - rss_rounds[0]) / sessions / (rounds - 1), 3) if rounds > 1 else None
+            ),
+            'peak_rss_mb': peak_rss_mb(),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест: одновременные сессии Streamlit в одном процессе")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="откуда брать запросы (приложение читает books.csv)")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--actions", type=int, default=5, help="действий каждой сессии за раунд")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--driver", choices=("direct", "apptest"), default="direct")
+    parser.add_argument("--timeout", type=float, default=120, help="секунд на один прогон скрипта")
+    parser.add_argument("--figure-cache", help="каталог дискового кэша графиков (по умолчанию — пустой временный)")
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["NEXTBOOK_FIGURE_CACHE"] = args.figure_cache or tmp
+        report = run_load(args.csv, args.sessions, args.rounds, args.actions, args.seed, args.driver, args.timeout)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
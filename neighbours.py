@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from artifact import DEFAULT_DIR, open_artifact
+
+# Предвычисленная таблица соседей: для каждой книги каталога — top-K рекомендаций
+# в режимах title, author и hybrid (веса по умолчанию). Хранится рядом с артефактом
+# как int32 bookID и float16 оценки, строки таблицы совпадают со строками артефакта:
+#   python neighbours.py -k 20 --workers 4
+
+NEIGHBOURS_DIR = "neighbours"
+MANIFEST = "manifest.json"
+MODES = ('title', 'author', 'hybrid')
+DEFAULT_K = 20
+
+_worker = None
+
+
+def _init_worker(directory):
+    from recommender import BookRecommender
+
+    global _worker
+    _worker = BookRecommender.from_artifact(open_artifact(directory), neighbours=False)
+
+
+def _neighbours_chunk(task):
+    # Соседи для части уникальных запросов одного режима
+    by, queries, k = task
+    ids = np.full((len(queries), k), -1, dtype=np.int32)
+    scores = np.zeros((len(queries), k), dtype=np.float16)
+    book_ids = _worker.df['bookID'].to_numpy()
+    for i, query in enumerate(queries):
+        positions, values = _worker.search(query, by, k)
+        ids[i, :len(positions)] = book_ids[positions]
+        scores[i, :len(positions)] = values
+    return ids, scores
+
+
+def _query_column(by):
+    # Запрос для книги: её название (title, hybrid) или строка авторов (author)
+    return 'authors' if by == 'author' else 'title'
+
+
+class NeighbourTable:
+    def __init__(self, artifact, manifest):
+        self.manifest = manifest
+        self.k = manifest['k']
+        self.ids = {}
+        self.scores = {}
+        for by in manifest['modes']:
+            self.ids[by] = artifact._array(os.path.join(NEIGHBOURS_DIR, f"{by}_ids.npy"))
+            self.scores[by] = artifact._array(os.path.join(NEIGHBOURS_DIR, f"{by}_scores.npy"))
+
+    def __contains__(self, by):
+        return by in self.ids
+
+    def lookup(self, by, row, n):
+        # bookID и оценки первых n соседей книги; -1 — недостающие соседи
+        ids = self.ids[by][row, :n]
+        found = ids >= 0
+        # float16 -> float64 по кратчайшей записи: 0.7017, а не 0.70166015625
+        scores = self.scores[by][row, :n][found]
+        return ids[found], np.array([float(np.format_float_positional(score)) for score in scores])
+
+
+def load_neighbours(artifact):
+    # Таблица подходит, только если собрана по этому же артефакту
+    manifest = artifact._json(os.path.join(NEIGHBOURS_DIR, MANIFEST))
+    if manifest is None:
+        return None
+    if manifest.get('csv_sha256') != artifact.manifest.get('csv_sha256') or manifest.get('rows') != artifact.manifest.get('rows'):
+        return None
+    return NeighbourTable(artifact, manifest)
+
+
+def build_neighbours(directory=DEFAULT_DIR, k=DEFAULT_K, modes=MODES, workers=None, chunk_size=256):
+    started = time.perf_counter()
+    artifact = open_artifact(directory)
+    rows = artifact.manifest['rows']
+    workers = workers or os.cpu_count() or 1
+
+    staging = tempfile.mkdtemp(prefix=".neighbours-", dir=directory)
+    stats = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(directory,)) as pool:
+        for by in modes:
+            mode_started = time.perf_counter()
+            # Одинаковые названия (авторы) дают одинаковую выдачу — считаем один раз
+            values = np.asarray(artifact.columns[_query_column(by)], dtype=object)
+            queries, inverse = np.unique(values, return_inverse=True)
+            tasks = [(by, queries[i:i + chunk_size].tolist(), k) for i in range(0, len(queries), chunk_size)]
+            parts = list(pool.map(_neighbours_chunk, tasks))
+            ids = np.concatenate([part[0] for part in parts])[inverse]
+            scores = np.concatenate([part[1] for part in parts])[inverse]
+            np.save(os.path.join(staging, f"{by}_ids.npy"), ids)
+            np.save(os.path.join(staging, f"{by}_scores.npy"), scores)
+            stats[by] = {
+                'queries': len(queries),
+                'seconds': round(time.perf_counter() - mode_started, 3),
+                'bytes': ids.nbytes + scores.nbytes,
+            }
+
+    manifest = {
+        'csv_sha256': artifact.manifest['csv_sha256'],
+        'rows': rows,
+        'k': k,
+        'modes': list(modes),
+        'workers': workers,
+        'stats': stats,
+        'bytes': sum(item['bytes'] for item in stats.values()),
+        'build_seconds': round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    target = os.path.join(directory, NEIGHBOURS_DIR)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(staging, target)
+    return manifest
+
+
+if __name__ == "__main__":
+    from artifact import DEFAULT_CSV, load_artifact
+
+    parser = argparse.ArgumentParser(description="Предвычисление top-K соседей каждой книги")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    parser.add_argument("-k", type=int, default=DEFAULT_K)
+    parser.add_argument("--by", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+
+    load_artifact(args.csv, args.dir)
+    manifest = build_neighbours(args.dir, args.k, args.by, args.workers, args.chunk_size)
+    for by, item in manifest['stats'].items():
+        print(f"{by:>7}: {item['queries']} запросов за {item['seconds']} с, {item['bytes'] / 2**20:.2f} МБ")
+    print(f"Таблица соседей (K={manifest['k']}, {manifest['rows']} книг, {manifest['workers']} процессов): "
+          f"{manifest['build_seconds']} с, {manifest['bytes'] / 2**20:.2f} МБ -> "
+          f"{os.path.join(args.dir, NEIGHBOURS_DIR)}")
@@ -0,0 +1,82 @@
+import numpy as np
+
+from similarity import string_hashes
+
+# Позиция строки каталога по bookID, названию или автору (таблица соседей, история,
+# удаление книг, книга-образец hybrid)
+
+LOOKUP_COLUMNS = ('bookID', 'title', 'authors')
+
+
+def _keys(values, strings):
+    # bookID — сам ключ, строки — 64-битные хэши (similarity.string_hashes)
+    if strings:
+        return string_hashes([str(value) for value in values])
+    return np.asarray(values, dtype=np.int64)
+
+
+class PositionIndex:
+    # Отсортированные ключи колонки и позиции строк в том же порядке вместо dict
+    # значение -> позиция в каждом процессе: в артефакте это memory-mapped массивы
+    # (или shared memory), поиск — np.searchsorted. Позиции строк, дописанных
+    # add_books, — в небольшом dict поверх до ближайшего compact(); удалённые
+    # строки пропускаются по маске alive
+    def __init__(self, values, strings=True):
+        self.strings = strings
+        keys = _keys(values, strings)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.extra = {}
+
+    @classmethod
+    def from_state(cls, state, strings=True):
+        index = cls.__new__(cls)
+        index.strings = strings
+        index.keys = state['keys']
+        index.order = state['order']
+        index.extra = {}
+        return index
+
+    def state(self):
+        keys, order = self.keys, self.order
+        if self.extra:
+            extra = list(self.extra.items())
+            keys = np.concatenate([keys, np.repeat([key for key, _ in extra], [len(rows) for _, rows in extra])])
+            order = np.concatenate([order, np.concatenate([rows for _, rows in extra])])
+            sort = np.lexsort((order, keys))
+            keys, order = keys[sort], order[sort]
+        return {'keys': keys, 'order': order}
+
+    def append(self, values, start):
+        for position, key in enumerate(_keys(values, self.strings).tolist(), start):
+            self.extra.setdefault(key, []).append(position)
+
+    def first(self, value, alive):
+        # Первая живая позиция с таким значением; None — такой строки нет
+        key = _keys([value], self.strings)[0]
+        start, end = int(np.searchsorted(self.keys, key, side='left')), int(np.searchsorted(self.keys, key, side='right'))
+        rows = self.order[start:end]
+        rows = rows[alive[rows]]
+        if len(rows):
+            return int(rows[0])
+        for position in self.extra.get(int(key), ()):
+            if alive[position]:
+                return position
+        return None
+
+    def positions(self, values, alive):
+        # Позиции живых строк для пачки значений (-1 — нет в каталоге): один
+        # searchsorted на всю пачку, отдельно ищутся только промахи
+        values = list(values)
+        keys = _keys(values, self.strings)
+        result = np.full(len(keys), -1, dtype=np.int64)
+        if len(self.keys) and len(keys):
+            i = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            rows = self.order[i]
+            found = (self.keys[i] == keys) & alive[rows]
+            result[found] = rows[found]
+        for j in np.flatnonzero(result < 0):
+            position = self.first(values[j], alive)
+            if position is not None:
+                result[j] = position
+        return result
@@ -0,0 +1,499 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from ann import IVFTitleIndex
+from artifact import reopen_artifact
+from caching import QueryCache
+from filters import FilterIndex, normalize_filters
+from hybrid import HybridFeatures, normalize_weights
+from instrumentation import span
+from loader import DERIVED_COLUMNS, concat_chunks, normalize_chunk, normalize_header, split_titles
+from neighbours import load_neighbours
+from positions import PositionIndex
+from results import Recommendations
+from similarity import AuthorIndex, TitleIndex, TokenIndex, top_n
+from works import WORK_COLUMNS, assign_works, cluster_works
+
+# Рекомендатель без зависимости от Streamlit: используется приложением,
+# пакетным CLI (batch.py) и воркерами пула процессов
+
+_worker = None
+
+
+def _init_worker(artifact_source, recommender):
+    # Воркер открывает тот же memory-mapped (или shared memory) артефакт, что и
+    # родитель, вместо того чтобы получать копию данных через pickle
+    global _worker
+    _worker = BookRecommender.from_artifact(reopen_artifact(artifact_source)) if artifact_source else recommender
+
+
+def _recommend_in_worker(task):
+    query, by, n_recommendations = task
+    return _worker.recommend_books(query, by, n_recommendations)
+
+
+class BookRecommender:
+    def __init__(self, data, title_mode='ngram'):
+        self.df = pd.DataFrame(data)
+        self.df.columns = [str(column).strip() for column in self.df.columns]
+        self.df['title'] = self.df['title'].str.strip()
+        self.df['authors'] = self.df['authors'].str.strip()
+        self.df['clean_title'], self.df['series'], self.df['series_number'] = split_titles(self.df['title'])
+        self.df['publication_date'] = pd.to_datetime(self.df['publication_date'], errors='coerce')
+        self.df = self.df.dropna(subset=['title', 'authors', 'average_rating']).reset_index(drop=True)
+        self.df['work_id'], self.df['work_block'] = cluster_works(self.df)
+        self.ratings = self.df['average_rating'].to_numpy(dtype='float64')
+        self.title_index = TitleIndex(self.df['clean_title'], mode=title_mode)
+        self.author_index = AuthorIndex(self.df['authors'])
+        self.token_index = TokenIndex(self.df['clean_title'], self.df['series'], self.df['series_number'])
+        self._init_state()
+
+    @classmethod
+    def from_artifact(cls, artifact, neighbours=True):
+        # Данные уже нормализованы, а индексы лежат в memory-mapped файлах.
+        # Если рядом собрана таблица соседей (neighbours.py), запросы по книгам
+        # каталога отвечаются из неё
+        recommender = cls.__new__(cls)
+        recommender.df = artifact.frame()
+        recommender.ratings = artifact.columns['average_rating']
+        recommender.title_index = artifact.title_index
+        recommender.author_index = artifact.author_index
+        recommender.token_index = artifact.token_index
+        recommender._init_state(artifact.source)
+        recommender._filters = artifact.filters
+        recommender._positions = dict(artifact.positions)
+        if neighbours:
+            recommender.neighbours = load_neighbours(artifact)
+        return recommender
+
+    def _init_state(self, artifact_source=None):
+        self.cache = QueryCache()
+        self.title_ann = None
+        self.neighbours = None
+        self.artifact_source = artifact_source
+        # revision растёт при каждом изменении каталога (add/update/remove_books)
+        self.revision = 0
+        self.alive = np.ones(len(self.df), dtype=bool)
+        # Позиции строк по bookID / названию / автору (positions.PositionIndex)
+        self._positions = {}
+        self._features = None
+        self._filters = None
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._refresh_order()
+
+    def __getstate__(self):
+        # Блокировки и фоновый поток не сериализуются (пул процессов в iter_recommendations)
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['_compactor'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _refresh_order(self):
+        order = np.argsort(-np.asarray(self.ratings), kind='stable')
+        self.rating_order = order if self.alive.all() else order[self.alive[order]]
+
+    def books(self):
+        # Текущий каталог без удалённых книг
+        with self._lock:
+            return self.df if self.alive.all() else self.df[self.alive].reset_index(drop=True)
+
+    def _lookup(self, column):
+        if column not in self._positions:
+            self._positions[column] = PositionIndex(self.df[column], strings=column != 'bookID')
+        return self._positions[column]
+
+    def _book_positions(self, book_ids):
+        # Позиции живых книг по bookID; отсутствующие в каталоге пропускаются
+        positions = self._lookup('bookID').positions(book_ids, self.alive)
+        return positions[positions >= 0]
+
+    def add_books(self, data):
+        # Дописывает книги без перестроения индексов: n-граммы новых названий уходят
+        # в дельта-матрицу TitleIndex, авторы — в конец списков AuthorIndex
+        frame = pd.DataFrame(data).copy()
+        if frame.empty:
+            # Пустой список или хвост CSV только из повреждённых строк
+            return self.df.iloc[[]]
+        frame.columns = normalize_header(frame.columns)
+        frame = frame.reindex(columns=[column for column in self.df.columns if column not in DERIVED_COLUMNS + WORK_COLUMNS])
+        frame = normalize_chunk(frame).reset_index(drop=True)
+        if frame.empty:
+            return frame
+        if 'work_id' in self.df:
+            # Новое издание известного произведения получает его work_id
+            frame['work_id'], frame['work_block'] = assign_works(self.df, frame)
+
+        with self._lock:
+            start = len(self.df)
+            self.df = concat_chunks([self.df, frame[self.df.columns]])
+            self.ratings = np.concatenate([np.asarray(self.ratings), frame['average_rating'].to_numpy()])
+            self.alive = np.concatenate([self.alive, np.ones(len(frame), dtype=bool)])
+            self.title_index.append(frame['clean_title'])
+            self.author_index.append(frame['authors'])
+            self.token_index.append(frame['clean_title'], frame['series'], frame['series_number'])
+            if self.title_ann is not None:
+                self.title_ann.append(np.arange(start, len(self.df)))
+            for column, lookup in self._positions.items():
+                lookup.append(frame[column], start)
+            self._changed()
+        return frame
+
+    def remove_books(self, book_ids):
+        # Удалённые позиции помечаются в индексах и исключаются из выдачи;
+        # физически строки уходят при compact()
+        with self._lock:
+            # Повторный bookID в запросе не удаляет книгу дважды
+            removed = list(dict.fromkeys(self._book_positions(book_ids).tolist()))
+            if not removed:
+                return self.df.iloc[[]]
+            self.alive[removed] = False
+            self.title_index.remove(removed)
+            self.author_index.remove(removed)
+            self.token_index.remove(removed)
+            self._changed()
+            return self.df.iloc[removed]
+
+    def update_books(self, data):
+        frame = pd.DataFrame(data)
+        if frame.empty:
+            return self.df.iloc[[]], self.df.iloc[[]]
+        frame.columns = normalize_header(frame.columns)
+        with self._lock:
+            removed = self.remove_books(pd.to_numeric(frame['bookID']).tolist())
+            added = self.add_books(frame)
+        return added, removed
+
+    def _changed(self):
+        # Таблица соседей описывает каталог на момент сборки
+        self.neighbours = None
+        self._features = None
+        self._filters = None
+        self._refresh_order()
+        self.cache.clear()
+        self.revision += 1
+
+    def pending_compaction(self):
+        # Доля «мусора»: удалённые строки и строки в дельта-матрице названий
+        delta = self.title_index.delta.shape[0] if self.title_index.delta is not None else 0
+        return ((~self.alive).sum() + delta) / max(len(self.alive), 1)
+
+    def compact(self):
+        # Сливает дельты и выбрасывает удалённые строки. Содержимое каталога
+        # не меняется, поэтому revision и кэш запросов остаются прежними
+        with self._lock, span("compact"):
+            if self.pending_compaction() == 0:
+                return False
+            keep = self.alive.copy()
+            title_index = self.title_index.compacted(keep)
+            if self.title_ann is not None:
+                self.title_ann = self.title_ann.compacted(title_index, keep)
+            self.title_index = title_index
+            self.author_index = self.author_index.compacted(keep)
+            self.token_index = self.token_index.compacted(keep)
+            self.df = self.df[keep].reset_index(drop=True)
+            self.ratings = np.asarray(self.ratings)[keep]
+            self.alive = np.ones(len(self.df), dtype=bool)
+            self._positions = {}
+            self._features = None
+            self._filters = None
+            self._refresh_order()
+            return True
+
+    def start_compaction(self, interval=300.0, min_pending=0.05):
+        # Фоновое сжатие раз в interval секунд, если мусора набралось не меньше min_pending
+        if self._compactor is not None:
+            return self._compactor
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                if self.pending_compaction() >= min_pending:
+                    self.compact()
+
+        self._compactor = threading.Thread(target=loop, name="catalog-compaction", daemon=True)
+        self._compactor.stop = stop
+        self._compactor.start()
+        return self._compactor
+
+    def stop_compaction(self):
+        if self._compactor is not None:
+            self._compactor.stop.set()
+            self._compactor = None
+
+    def enable_ann(self, **params):
+        # Приближённый поиск по названиям (см. ann.py); n_probe — баланс recall/задержки
+        self.title_ann = IVFTitleIndex(self.title_index, **params)
+        self.cache.clear()
+        return self.title_ann
+
+    def disable_ann(self):
+        self.title_ann = None
+        self.cache.clear()
+
+    def get_title_similarity(self, title1, title2):
+        return SequenceMatcher(None, title1.lower(), title2.lower()).ratio()
+
+    def get_author_similarity(self, author1, author2):
+        authors1 = set(author1.lower().replace('/', ',').split(','))
+        authors2 = set(author2.lower().replace('/', ',').split(','))
+        intersection = len(authors1.intersection(authors2))
+        union = len(authors1.union(authors2))
+        return intersection / union if union > 0 else 0
+
+    def recommend_books(self, query, by='title', n_recommendations=5, weights=None, filters=None):
+        # Прежний интерфейс: список словарей, новый на каждый вызов
+        return self.recommend(query, by, n_recommendations, weights, filters).to_dicts()
+
+    def recommend(self, query, by='title', n_recommendations=5, weights=None, filters=None):
+        # Колоночный результат (results.Recommendations); weights — веса признаков
+        # для by='hybrid' (см. hybrid.DEFAULT_WEIGHTS), filters — ограничения выдачи
+        # (см. filters.py), применяются до выбора top-N
+        key = (query, by, n_recommendations)
+        if by == 'hybrid':
+            weights = normalize_weights(weights)
+            key += (tuple(sorted(weights.items())),)
+        filters = normalize_filters(filters)
+        if filters is not None:
+            key += (('filters', filters),)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Результат кладётся в кэш под той же блокировкой, под которой посчитан:
+        # иначе правка каталога между расчётом и put вернула бы в кэш старую выдачу
+        with span("recommend", by=by, n=n_recommendations), self._lock:
+            recommendations = self._recommend_locked(query, by, n_recommendations, weights, filters)
+            self.cache.put(key, recommendations)
+        return recommendations
+
+    def iter_recommendations(self, queries, by='title', n_recommendations=5, workers=None, chunksize=64):
+        # Результаты отдаются по мере готовности и в порядке запросов
+        queries = list(queries)
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(queries) <= chunksize:
+            for query in queries:
+                yield self.recommend_books(query, by, n_recommendations)
+            return
+
+        # Артефакт на диске соответствует каталогу, только пока его не меняли
+        artifact_source = self.artifact_source if self.revision == 0 else None
+        initargs = (artifact_source, None if artifact_source else self)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            tasks = ((query, by, n_recommendations) for query in queries)
+            yield from pool.map(_recommend_in_worker, tasks, chunksize=chunksize)
+
+    def recommend_many(self, queries, by='title', n_recommendations=5, workers=None, chunksize=64):
+        return list(self.iter_recommendations(queries, by, n_recommendations, workers, chunksize))
+
+    def recommend_batch(self, requests):
+        # Пачка запросов (query, by, n) из HTTP-сервиса: повторы считаются один раз,
+        # запросы по названию без таблицы соседей — одним матричным произведением
+        results = [None] * len(requests)
+        misses = {}
+        for i, (query, by, n) in enumerate(requests):
+            key = (query, by, n) if by != 'hybrid' else (query, by, n, tuple(sorted(normalize_weights().items())))
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.setdefault(key, []).append(i)
+        if not misses:
+            return results
+
+        with span("recommend.batch", batch=len(misses)), self._lock:
+            found = {}
+            titles = []
+            for key in misses:
+                query, by, n = key[:3]
+                weights = normalize_weights() if by == 'hybrid' else None
+                hit = self._lookup_neighbours(query, by, n, weights)
+                if hit is not None:
+                    found[key] = hit
+                elif by == 'title' and self.title_ann is None:
+                    titles.append(key)
+                else:
+                    found[key] = self._search(query, by, n, weights)
+            if titles:
+                n = max(key[2] for key in titles)
+                batch = self.title_index.search_many([key[0] for key in titles], self.ratings, n, self._filter_mask(None))
+                for key, (positions, scores) in zip(titles, batch):
+                    found[key] = positions[:key[2]], scores[:key[2]]
+
+            with span("recommend.materialize", batch=len(found)):
+                for key, (positions, scores) in found.items():
+                    recommendations = Recommendations.take(self.df, positions, scores)
+                    self.cache.put(key, recommendations)
+                    for i in misses[key]:
+                        results[i] = recommendations
+        return results
+
+    def _recommend_locked(self, query, by, n_recommendations, weights=None, filters=None):
+        # С фильтрами таблица соседей не подходит: её top-K мог целиком не пройти фильтр
+        found = self._lookup_neighbours(query, by, n_recommendations, weights) if filters is None else None
+        if found is None:
+            found = self._search(query, by, n_recommendations, weights, filters)
+        positions, scores = found
+
+        with span("recommend.materialize"):
+            return Recommendations.take(self.df, positions, scores)
+
+    def recommend_page(self, query, by='title', page=0, page_size=20, weights=None, filters=None):
+        # Страница выдачи. top-n берётся с запасом до степени двойки страниц, поэтому
+        # листание пересчитывает оценки log2(страниц) раз (argpartition, без полной
+        # сортировки каталога), а остальные страницы берутся срезом из кэша запросов
+        n = page_size << page.bit_length()
+        if by == 'history':
+            recommendations = self.recommend_for_history(query, weights, n, filters)
+        else:
+            recommendations = self.recommend(query, by, n, weights, filters)
+        return recommendations[page * page_size:(page + 1) * page_size]
+
+    def recommend_for_history(self, book_ids, weights=None, n=5, filters=None):
+        # Рекомендации по истории чтения: профиль из всех прочитанных книг и одна
+        # оценка всего каталога (см. _history_search). Прочитанные книги и другие
+        # издания тех же произведений в выдачу не попадают; пустая история — популярное
+        weights = normalize_weights(weights)
+        filters = normalize_filters(filters)
+        key = ('history', tuple(sorted(set(book_ids))), n, tuple(sorted(weights.items())), filters)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with span("recommend", by='history', n=n), self._lock:
+            positions, scores = self._history_search(key[1], n, weights, filters)
+            with span("recommend.materialize"):
+                recommendations = Recommendations.take(self.df, positions, scores)
+            self.cache.put(key, recommendations)
+        return recommendations
+
+    def _history_search(self, book_ids, n, weights, filters=None):
+        seeds = self._book_positions(book_ids)
+        if self._features is None:
+            self._features = HybridFeatures(self.df)
+
+        title_scores = np.zeros(len(self.df))
+        author_scores = np.zeros(len(self.df))
+        if len(seeds):
+            with span("history.profile", seeds=len(seeds)):
+                title_scores = self.title_index.profile_scores(seeds)
+                # Жаккар по авторам — среднее по образцам; одинаковые строки авторов считаются один раз
+                authors, counts = np.unique(self.df['authors'].to_numpy()[seeds].astype(str), return_counts=True)
+                for value, count in zip(authors, counts):
+                    rows, scores = self.author_index.candidates(value)
+                    author_scores[rows] += scores * count
+                author_scores /= len(seeds)
+        scores = self._features.profile_score(seeds, title_scores, author_scores, weights)
+
+        scores[self.title_index.removed] = -np.inf
+        if len(seeds):
+            scores[seeds] = -np.inf
+            if 'work_id' in self.df:
+                works = self.df['work_id'].to_numpy()
+                scores[np.isin(works, works[seeds])] = -np.inf
+        mask = self._filter_mask(filters)
+        if mask is not None:
+            scores[~mask] = -np.inf
+        with span("history.select"):
+            positions = top_n(scores, np.asarray(self.ratings), n)
+        return positions, scores[positions]
+
+    def book_titles(self, book_ids):
+        # Названия книг каталога по bookID (для списка истории в приложении)
+        with self._lock:
+            book_ids = list(book_ids)
+            positions = self._lookup('bookID').positions(book_ids, self.alive)
+            titles = self.df['title']
+            return {book_id: titles.iat[position] for book_id, position in zip(book_ids, positions) if position >= 0}
+
+    def find_book(self, title):
+        # bookID первой живой книги с таким названием
+        with self._lock:
+            position = self._first_position('title', title)
+            return None if position is None else self.df['bookID'].iat[position].item()
+
+    def search(self, query, by='title', n=5, weights=None, filters=None):
+        # Позиции и оценки top-n без сборки словарей (сборка таблицы соседей)
+        if by == 'hybrid':
+            weights = normalize_weights(weights)
+        with self._lock:
+            return self._search(query, by, n, weights, normalize_filters(filters))
+
+    def _filter_mask(self, filters):
+        # Строки, которые могут попасть в выдачу: прошедшие фильтры и по одному
+        # изданию на произведение (work_id, см. works.py); None — ограничений нет.
+        # Индекс колонок строится один раз на версию каталога, сочетания кэшируются в нём
+        if filters is None and 'work_id' not in self.df:
+            return None
+        if self._filters is None:
+            with span("filters.index"):
+                self._filters = FilterIndex(self.df, self.alive)
+        return self._filters.mask(filters)
+
+    def _search(self, query, by, n, weights=None, filters=None):
+        mask = self._filter_mask(filters)
+        if by == 'title':
+            # Приближённый поиск смотрит только часть кластеров: с фильтром их
+            # кандидаты могли бы целиком отсеяться, поэтому ищем точно
+            if self.title_ann is not None and filters is None:
+                return self.title_ann.search(query, self.ratings, n, mask=mask)
+            return self.title_index.search(query, self.ratings, n, mask=mask)
+        if by == 'author':
+            return self.author_index.search(query, self.ratings, n, self.rating_order, mask)
+        if by == 'hybrid':
+            return self._hybrid_search(query, n, weights, mask)
+        if by == 'tokens':
+            return self.token_index.search(query, self.ratings, n, mask)
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    def _lookup_neighbours(self, query, by, n, weights):
+        # O(K) ответ из таблицы соседей для книги каталога; произвольный текст,
+        # свои веса hybrid и n > K считаются как обычно
+        table = self.neighbours
+        if table is None or by not in table or n > table.k:
+            return None
+        if by == 'hybrid' and weights != normalize_weights():
+            return None
+        row = self._first_position('authors' if by == 'author' else 'title', query)
+        if row is None:
+            return None
+        with span("recommend.neighbours"):
+            ids, scores = table.lookup(by, row, n)
+            return self._lookup('bookID').positions(ids, self.alive), scores
+
+    def _first_position(self, column, value):
+        # Позиция первой живой книги с таким значением колонки
+        return self._lookup(column).first(value, self.alive)
+
+    def _hybrid_search(self, query, n, weights, mask=None):
+        # Книга-образец — первая книга с таким названием; для произвольного текста
+        # работают только похожесть названия и популярность
+        if self._features is None:
+            self._features = HybridFeatures(self.df)
+        seed = self._first_position('title', query)
+
+        title_scores = self.title_index.scores(query, mode='ngram')
+        author_rows, author_scores = (
+            self.author_index.candidates(self.df['authors'].iat[seed]) if seed is not None
+            else (np.empty(0, dtype=np.int32), np.empty(0))
+        )
+        scores = self._features.score(seed, title_scores, author_rows, author_scores, weights)
+
+        scores[self.title_index.titles.positions(query.lower())] = -np.inf
+        scores[self.title_index.removed] = -np.inf
+        if seed is not None:
+            scores[seed] = -np.inf
+        if mask is not None:
+            scores[~mask] = -np.inf
+        with span("hybrid.select"):
+            positions = top_n(scores, np.asarray(self.ratings), n)
+        return positions, scores[positions]
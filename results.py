@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# Результат рекомендаций в колоночном виде: позиции строк каталога, оценки и
+# значения нужных колонок только для итоговых N книг. Записи (__slots__) и
+# словари собираются по требованию, DataFrame для графика — прямо из колонок
+
+FIELDS = ('bookID', 'title', 'authors', 'similarity', 'average_rating', 'publication_date', 'ratings_count', 'num_pages')
+# Значения по умолчанию для колонок, которых может не быть в каталоге
+DEFAULTS = {'publication_date': 'N/A', 'ratings_count': 0, 'num_pages': 'N/A'}
+
+
+class Recommendation:
+    __slots__ = FIELDS
+
+    def __init__(self, *values):
+        for name, value in zip(FIELDS, values):
+            setattr(self, name, value)
+
+    # Доступ как к словарю — для кода, написанного под прежние dict-записи
+    def __getitem__(self, name):
+        if name not in FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name):
+        return name in FIELDS
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in FIELDS else default
+
+    def keys(self):
+        return FIELDS
+
+    def items(self):
+        return ((name, getattr(self, name)) for name in FIELDS)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def __repr__(self):
+        return f"Recommendation({self.as_dict()!r})"
+
+
+class Recommendations:
+    # Неизменяемый результат: безопасно отдавать из кэша без копирования
+    __slots__ = ('positions', 'scores', 'columns')
+
+    def __init__(self, positions, scores, columns):
+        self.positions = positions
+        self.scores = scores
+        self.columns = columns
+
+    @classmethod
+    def take(cls, df, positions, scores):
+        # Значения колонок только для выбранных позиций: take по массиву колонки,
+        # без Series-строк и без копирования остальных строк каталога
+        columns = {}
+        for name in FIELDS:
+            if name == 'similarity':
+                columns[name] = np.asarray(scores, dtype=np.float64)
+            elif name in df:
+                columns[name] = df[name].array.take(positions)
+            else:
+                columns[name] = np.full(len(positions), DEFAULTS[name], dtype=object)
+        return cls(positions, scores, columns)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, rows):
+        # Срез строк (страница выдачи) — срезы тех же колонок, без повторного take
+        if not isinstance(rows, slice):
+            raise TypeError("Recommendations поддерживает только срезы")
+        return Recommendations(self.positions[rows], self.scores[rows],
+                               {name: values[rows] for name, values in self.columns.items()})
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def _values(self):
+        return zip(*(self.columns[name].tolist() for name in FIELDS))
+
+    def records(self):
+        return [Recommendation(*values) for values in self._values()]
+
+    def to_dicts(self):
+        return [dict(zip(FIELDS, values)) for values in self._values()]
+
+    def frame(self):
+        return pd.DataFrame(self.columns, columns=list(FIELDS))
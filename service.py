@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs, quote, urlsplit
+
+import numpy as np
+
+from artifact import DEFAULT_CSV, DEFAULT_DIR
+from batch import to_jsonable
+from instrumentation import metrics, span
+
+# Локальный HTTP/JSON-сервис рекомендаций на asyncio. Одновременные запросы
+# собираются в микропачки (BookRecommender.recommend_batch), при переполнении
+# очереди сервис сразу отвечает 503. Запуск и нагрузочный тест:
+#   python service.py serve --port 8765
+#   python service.py load --port 8765 --concurrency 32 --requests 5000
+
+MODES = ('title', 'author', 'hybrid', 'tokens')
+MAX_N = 100
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class RecommendationService:
+    def __init__(self, catalog, max_batch=64, max_wait=0.002, max_pending=1024):
+        # catalog — LiveCatalog: рекомендатель берётся заново для каждой пачки,
+        # потому что при перезагрузке CSV он заменяется целиком
+        self.catalog = catalog
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.started = time.time()
+        self.stats = {'requests': 0, 'rejected': 0, 'batches': 0, 'batched_requests': 0}
+        self._batcher = None
+
+    def start(self):
+        if self._batcher is None:
+            self._batcher = asyncio.get_running_loop().create_task(self._run_batches())
+        return self
+
+    async def recommend(self, query, by, n):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((query, by, n, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return None
+        self.stats['requests'] += 1
+        return await future
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.stats['batches'] += 1
+            self.stats['batched_requests'] += len(batch)
+            requests = [item[:3] for item in batch]
+            try:
+                # Расчёт — в потоке, чтобы цикл событий продолжал принимать запросы
+                results = await loop.run_in_executor(None, self._recommend_batch, requests)
+            except Exception as error:
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(error)
+                continue
+            for item, result in zip(batch, results):
+                if not item[3].done():
+                    item[3].set_result(result)
+
+    def _recommend_batch(self, requests):
+        with span("service.batch", size=len(requests)):
+            return self.catalog.recommender.recommend_batch(requests)
+
+    def health(self):
+        recommender = self.catalog.recommender
+        batches = self.stats['batches']
+        return {
+            'status': 'ok',
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'books': int(recommender.alive.sum()),
+            'version': list(self.catalog.version),
+            'neighbour_table': recommender.neighbours is not None,
+            'queue': self.queue.qsize(),
+            'queue_limit': self.queue.maxsize,
+            'mean_batch': round(self.stats['batched_requests'] / batches, 2) if batches else 0.0,
+            'cache': recommender.cache.stats(),
+            **self.stats,
+        }
+
+    def render_metrics(self):
+        lines = [metrics.render_prometheus().rstrip("\n")]
+        for name, value in (('requests_total', self.stats['requests']), ('rejected_total', self.stats['rejected']),
+                            ('batches_total', self.stats['batches'])):
+            lines += [f"# TYPE nextbook_service_{name} counter", f"nextbook_service_{name} {value}"]
+        lines += ["# TYPE nextbook_service_queue gauge", f"nextbook_service_queue {self.queue.qsize()}"]
+        return "\n".join(lines) + "\n"
+
+    async def handle(self, method, target):
+        url = urlsplit(target)
+        if method != 'GET':
+            return 405, {'error': "поддерживается только GET"}
+        if url.path == '/health':
+            return 200, self.health()
+        if url.path == '/metrics':
+            return 200, self.render_metrics()
+        if url.path != '/recommend':
+            return 404, {'error': f"неизвестный путь {url.path}"}
+
+        params = parse_qs(url.query)
+        query = params.get('query', [''])[0]
+        by = params.get('by', ['title'])[0]
+        if not query:
+            return 400, {'error': "нужен параметр query"}
+        if by not in MODES:
+            return 400, {'error': f"by должен быть одним из: {', '.join(MODES)}"}
+        try:
+            n = int(params.get('n', ['5'])[0])
+        except ValueError:
+            return 400, {'error': "n должен быть целым числом"}
+        if not 1 <= n <= MAX_N:
+            return 400, {'error': f"n должен быть от 1 до {MAX_N}"}
+
+        recommendations = await self.recommend(query, by, n)
+        if recommendations is None:
+            return 503, {'error': "сервис перегружен, повторите запрос позже"}
+        return 200, {
+            'query': query,
+            'by': by,
+            'n': n,
+            'recommendations': [{key: to_jsonable(value) for key, value in item.items()} for item in recommendations],
+        }
+
+    async def serve_connection(self, reader, writer):
+        # Минимальный HTTP/1.1 с keep-alive: запросы без тела, ответы JSON или текст
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    status, body = 400, {'error': "некорректная строка запроса"}
+                else:
+                    status, body = await self.handle(parts[0], parts[1])
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                if isinstance(body, str):
+                    payload, content_type = body.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    payload, content_type = json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json'
+                head = [
+                    f"HTTP/1.1 {status} {STATUS[status]}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                if status == 503:
+                    head.append("Retry-After: 1")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(catalog, host="127.0.0.1", port=8765, **params):
+    service = RecommendationService(catalog, **params).start()
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"Сервис рекомендаций: http://{host}:{port}/recommend?query=...&by=title&n=5")
+    async with server:
+        await server.serve_forever()
+
+
+async def _client(host, port, queries, by, n, counter, total, timings, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < total:
+            counter[0] += 1
+            query = random.choice(queries)
+            target = f"/recommend?query={quote(query, safe='')}&by={by}&n={n}"
+            started = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, queries, by='title', n=5, concurrency=32, total=5000):
+    # Нагрузочный генератор: concurrency соединений с keep-alive, total запросов
+    timings = []
+    statuses = {}
+    counter = [0]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, queries, by, n, counter, total, timings, statuses) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(timings),
+        'concurrency': concurrency,
+        'qps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+        'max_ms': round(max(timings), 3),
+        'statuses': statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-сервис рекомендаций и нагрузочный генератор")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="запустить сервис")
+    serve_parser.add_argument("--csv", default=DEFAULT_CSV)
+    serve_parser.add_argument("--dir", default=DEFAULT_DIR)
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--shared", help="имя каталога в shared memory (python shared.py publish)")
+    serve_parser.add_argument("--max-batch", type=int, default=64)
+    serve_parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    serve_parser.add_argument("--max-pending", type=int, default=1024)
+
+    load_parser = commands.add_parser("load", help="нагрузочный тест запущенного сервиса")
+    load_parser.add_argument("--csv", default=DEFAULT_CSV)
+    load_parser.add_argument("--dir", default=DEFAULT_DIR)
+    load_parser.add_argument("--host", default="127.0.0.1")
+    load_parser.add_argument("--port", type=int, default=8765)
+    load_parser.add_argument("--by", choices=MODES, default="title")
+    load_parser.add_argument("-n", type=int, default=5)
+    load_parser.add_argument("--concurrency", type=int, default=32)
+    load_parser.add_argument("--requests", type=int, default=5000)
+    load_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        from live_catalog import LiveCatalog
+
+        catalog = LiveCatalog(args.csv, args.dir, shared=args.shared).start()
+        asyncio.run(serve(catalog, args.host, args.port, max_batch=args.max_batch,
+                          max_wait=args.max_wait_ms / 1000, max_pending=args.max_pending))
+    else:
+        from artifact import load_artifact
+
+        random.seed(args.seed)
+        column = 'authors' if args.by == 'author' else 'title'
+        queries = sorted(set(load_artifact(args.csv, args.dir).columns[column]))
+        result = asyncio.run(load_test(args.host, args.port, queries, args.by, args.n, args.concurrency, args.requests))
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import signal
+import sys
+from multiprocessing import get_context, resource_tracker, shared_memory
+
+import numpy as np
+
+from artifact import DEFAULT_CSV, DEFAULT_DIR, Artifact, load_artifact
+
+# Публикация артефакта в multiprocessing.shared_memory: один процесс копирует все
+# массивы артефакта (колонки, буферы строк, индексы, таблицу соседей) в один
+# сегмент, воркеры Streamlit / service.py подключаются к нему по имени без копий:
+#   python shared.py publish --name nextbook
+#   NEXTBOOK_SHARED_CATALOG=nextbook streamlit run BookRecommender.py
+#   python service.py serve --shared nextbook
+
+DEFAULT_NAME = "nextbook"
+ALIGNMENT = 64
+
+
+def _layout_name(name):
+    return f"{name}-layout"
+
+
+# Подключённые сегменты живут до конца процесса: на их память ссылаются массивы
+# и Arrow-буферы рекомендателя, переживающие сам SharedArtifact
+_attached = {}
+
+
+def _attach(name):
+    segment = _attached.get(name)
+    if segment is not None:
+        return segment
+    if sys.version_info >= (3, 13):
+        segment = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        segment = shared_memory.SharedMemory(name=name)
+        # До 3.13 resource_tracker удаляет сегмент при выходе любого подключившегося процесса
+        resource_tracker.unregister(segment._name, "shared_memory")
+    _attached[name] = segment
+    return segment
+
+
+class SharedCatalog:
+    # Владелец опубликованных сегментов: держит их, пока не вызван unlink()
+    def __init__(self, name, data, layout):
+        self.name = name
+        self.data = data
+        self.layout = layout
+
+    @property
+    def nbytes(self):
+        return self.data.size
+
+    def unlink(self):
+        for segment in (self.data, self.layout):
+            _attached.pop(segment.name, None)
+            if sys.version_info < (3, 13):
+                # Дочерние процессы (spawn/fork) делят resource_tracker владельца, и их
+                # unregister в _attach снимает и его запись; без повторной регистрации
+                # unlink() падал бы в трекере с KeyError
+                resource_tracker.register(segment._name, "shared_memory")
+            try:
+                segment.close()
+            except BufferError:
+                # В этом же процессе ещё есть массивы поверх сегмента
+                pass
+            segment.unlink()
+
+
+def publish(directory=DEFAULT_DIR, name=DEFAULT_NAME):
+    arrays = {}
+    documents = {}
+    directory = os.path.realpath(directory)
+    for root, dirs, files in os.walk(directory):
+        # Служебные каталоги сборки (.artifact-*, .neighbours-*) пропускаются
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            key = os.path.relpath(path, directory)
+            if filename.endswith('.npy'):
+                arrays[key] = np.load(path, mmap_mode='r')
+            elif filename.endswith('.json'):
+                with open(path, encoding='utf-8') as f:
+                    documents[key] = json.load(f)
+
+    entries = {}
+    offset = 0
+    for key, array in arrays.items():
+        entries[key] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    data = shared_memory.SharedMemory(name=name, create=True, size=max(offset, 1))
+    for key, array in arrays.items():
+        entry = entries[key]
+        target = np.ndarray(array.shape, dtype=array.dtype, buffer=data.buf, offset=entry['offset'])
+        target[...] = array
+
+    text = json.dumps({'arrays': entries, 'json': documents}).encode('utf-8')
+    layout = shared_memory.SharedMemory(name=_layout_name(name), create=True, size=8 + len(text))
+    layout.buf[:8] = len(text).to_bytes(8, 'little')
+    layout.buf[8:8 + len(text)] = text
+    # Подключение из этого же процесса использует сегменты владельца
+    _attached[name] = data
+    _attached[_layout_name(name)] = layout
+    return SharedCatalog(name, data, layout)
+
+
+class SharedArtifact(Artifact):
+    # Тот же Artifact, но массивы — представления поверх сегмента shared memory;
+    # строковые колонки при наличии pyarrow тоже (см. artifact._arrow_strings)
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self._data = _attach(name)
+        layout = _attach(_layout_name(name))
+        size = int.from_bytes(bytes(layout.buf[:8]), 'little')
+        document = json.loads(bytes(layout.buf[8:8 + size]).decode('utf-8'))
+        self._entries = document['arrays']
+        self._documents = document['json']
+        super().__init__(None, self._documents['manifest.json'])
+
+    @property
+    def source(self):
+        return ('shared', self.name)
+
+    def _array(self, filename):
+        entry = self._entries[filename]
+        array = np.ndarray(tuple(entry['shape']), dtype=np.dtype(entry['dtype']), buffer=self._data.buf, offset=entry['offset'])
+        array.flags.writeable = False
+        return array
+
+    def _json(self, filename):
+        return self._documents.get(filename)
+
+
+def private_mb():
+    # Память, принадлежащая только этому процессу (Linux, /proc/self/smaps_rollup)
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    kb = sum(int(fields.get(name, '0 kB').split()[0]) for name in ('Private_Clean', 'Private_Dirty'))
+    return round(kb / 1024, 1)
+
+
+def _footprint_worker(args):
+    mode, location, queries, results = args
+    from recommender import BookRecommender
+
+    # Базовая память интерпретатора и библиотек одинакова во всех режимах — вычитается
+    before = private_mb()
+    if mode == 'shared':
+        recommender = BookRecommender.from_artifact(SharedArtifact(location))
+    elif mode == 'directory':
+        recommender = BookRecommender.from_artifact(load_artifact(DEFAULT_CSV, location))
+    else:
+        from loader import read_catalog
+        recommender = BookRecommender(read_catalog(location))
+    loaded = private_mb()
+    for query in queries:
+        recommender.recommend_books(query, 'title', 5)
+    # Отдельно — сам каталог и рабочая память запросов (буферы аллокатора, страницы библиотек)
+    results.put((loaded - before, private_mb() - loaded))
+
+
+def footprint(mode, location, workers, queries):
+    # Суммарная частная память каталога и индексов в workers процессах
+    context = get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_footprint_worker, args=((mode, location, queries, results),))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    values = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    catalog = sum(value[0] for value in values)
+    queries = sum(value[1] for value in values)
+    return {
+        'workers': workers,
+        'private_mb_total': round(catalog + queries, 1),
+        'private_mb_per_worker': round((catalog + queries) / workers, 1),
+        'catalog_mb_per_worker': round(catalog / workers, 1),
+        'queries_mb_per_worker': round(queries / workers, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Каталог и индексы в shared memory для нескольких процессов")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = commands.add_parser("publish", help="опубликовать артефакт и держать сегменты до Ctrl+C")
+    publish_parser.add_argument("--csv", default=DEFAULT_CSV)
+    publish_parser.add_argument("--dir", default=DEFAULT_DIR)
+    publish_parser.add_argument("--name", default=DEFAULT_NAME)
+
+    footprint_parser = commands.add_parser("footprint", help="частная память воркеров: CSV, mmap-артефакт, shared memory")
+    footprint_parser.add_argument("--csv", default=DEFAULT_CSV)
+    footprint_parser.add_argument("--dir", default=DEFAULT_DIR)
+    footprint_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    footprint_parser.add_argument("--queries", type=int, default=50)
+
+    args = parser.parse_args(argv)
+    load_artifact(args.csv, args.dir)
+    if args.command == "publish":
+        catalog = publish(args.dir, args.name)
+        print(f"Опубликовано {catalog.nbytes / 2**20:.1f} МБ в shared memory '{args.name}'")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            while True:
+                signal.pause()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            catalog.unlink()
+        return
+
+    name = f"{DEFAULT_NAME}-footprint-{os.getpid()}"
+    catalog = publish(args.dir, name)
+    try:
+        print(f"Сегмент shared memory: {catalog.nbytes / 2**20:.1f} МБ на все воркеры")
+        titles = load_artifact(args.csv, args.dir).columns['title'][:args.queries]
+        for mode, location in (('csv', args.csv), ('directory', args.dir), ('shared', name)):
+            for workers in args.workers:
+                result = footprint(mode, location, workers, list(titles))
+                print(f"{mode:>9} x{workers}: {result['private_mb_total']} МБ частной памяти "
+                      f"({result['private_mb_per_worker']} МБ на воркер: каталог {result['catalog_mb_per_worker']}, "
+                      f"запросы {result['queries_mb_per_worker']})")
+    finally:
+        catalog.unlink()
+
+
+if __name__ == "__main__":
+    main()
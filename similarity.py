@@ -0,0 +1,684 @@
+import hashlib
+import re
+
+import numpy as np
+import scipy.sparse as sp
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from instrumentation import span
+
+NGRAM_SIZE = 3
+
+# Слова и номера в серии ("#6"); служебные слова не индексируются
+TOKEN_PATTERN = re.compile(r"#\d+(?:\.\d+)?|\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or s that the this to with "
+    "el la los las de del y le les des du et un une der die das und ein eine il di".split()
+)
+# Слова поля серии хранятся в общем словаре с этим префиксом
+SERIES_PREFIX = "series:"
+
+
+def char_ngrams(text, n=NGRAM_SIZE):
+    # Пробелы по краям дают отдельные n-граммы для начала и конца слова
+    text = f" {text.lower()} "
+    if len(text) <= n:
+        return [text]
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def author_tokens(authors):
+    # Та же токенизация, что и в BookRecommender.get_author_similarity
+    return set(authors.lower().replace('/', ',').split(','))
+
+
+def title_tokens(text):
+    return [token for token in TOKEN_PATTERN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+def series_tokens(series, number):
+    # Название серии и её номер ("#6") — отдельное поле документа. Номер ещё и
+    # склеивается с названием ("harry potter#6"), чтобы запрос находил именно этот том
+    tokens = title_tokens(series) if isinstance(series, str) else []
+    if number == number and number is not None:
+        mark = f"#{float(number):g}"
+        tokens = tokens + [mark] + ([" ".join(tokens) + mark] if tokens else [])
+    return [SERIES_PREFIX + token for token in tokens]
+
+
+def _volume_keys(tokens, vocab):
+    # Для каждого "#n" запроса — самая длинная цепочка слов перед ним, которая
+    # вместе с номером есть в словаре серий: "... Harry Potter #6" -> "harry potter#6"
+    keys = []
+    for i, token in enumerate(tokens):
+        if not token.startswith('#'):
+            continue
+        words = [word for word in tokens[:i] if not word.startswith('#')]
+        for k in range(len(words), 0, -1):
+            key = SERIES_PREFIX + " ".join(words[-k:]) + token
+            if key in vocab:
+                keys.append(key)
+                break
+    return keys
+
+
+def top_n(scores, tiebreak, n):
+    # Позиции top-N по (scores, tiebreak) по убыванию. При равенстве обоих ключей
+    # сохраняется исходный порядок строк — как у sorted(..., reverse=True).
+    scores = np.asarray(scores, dtype=np.float64)
+    valid = np.isfinite(scores)
+    n = min(n, int(valid.sum()))
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if n < len(scores):
+        masked = np.where(valid, scores, -np.inf)
+        part = np.argpartition(-masked, n - 1)[:n]
+        # Все строки с оценкой, равной пороговой, тоже участвуют в сортировке,
+        # иначе разрешение ничьих по рейтингу зависело бы от argpartition
+        candidates = np.flatnonzero(masked >= masked[part].min())
+    else:
+        candidates = np.flatnonzero(valid)
+
+    order = np.lexsort((-tiebreak[candidates], -scores[candidates]))
+    return candidates[order[:n]]
+
+
+def _string_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def string_hashes(values):
+    # 64-битные хэши строк (blake2b): одинаковы во всех процессах, в отличие от hash().
+    # Коллизия даже на миллионе строк практически невозможна (~1e-7), поэтому при
+    # поиске по хэшу сами строки не сравниваются
+    return np.fromiter((_string_hash(value) for value in values), dtype=np.int64, count=len(values))
+
+
+class Vocabulary:
+    # Словарь строка -> номер столбца без dict на весь словарь: отсортированные хэши
+    # и номера — массивы (в артефакте memory-mapped или в shared memory, общие для
+    # процессов), сами строки нужны только для перебора. Новые строки — в dict поверх
+    def __init__(self, strings=(), hashes=None, ids=None):
+        if hashes is None:
+            hashes = string_hashes(strings)
+            ids = np.argsort(hashes, kind='stable').astype(np.int32)
+            hashes = hashes[ids]
+        self.strings = strings
+        self.hashes = hashes
+        self.ids = ids
+        self.added = {}
+
+    def state(self):
+        if not self.added:
+            return self.strings, self.hashes, self.ids
+        merged = Vocabulary(list(self))
+        return merged.strings, merged.hashes, merged.ids
+
+    def copy(self):
+        vocab = Vocabulary(self.strings, self.hashes, self.ids)
+        vocab.added = dict(self.added)
+        return vocab
+
+    def __len__(self):
+        return len(self.strings) + len(self.added)
+
+    def __iter__(self):
+        # В порядке номеров столбцов
+        yield from self.strings
+        yield from self.added
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        col = self.added.get(key)
+        if col is None and len(self.hashes):
+            value = _string_hash(key)
+            i = int(np.searchsorted(self.hashes, value))
+            if i < len(self.hashes) and self.hashes[i] == value:
+                col = int(self.ids[i])
+        return default if col is None else col
+
+    def setdefault(self, key, value):
+        col = self.get(key)
+        if col is None:
+            self.added[key] = col = value
+        return col
+
+    def columns(self, keys):
+        # Номера столбцов пачки строк (-1 — нет в словаре): один searchsorted на всю пачку
+        cols = np.full(len(keys), -1, dtype=np.int64)
+        if len(self.hashes) and len(keys):
+            hashes = string_hashes(keys)
+            i = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+            found = self.hashes[i] == hashes
+            cols[found] = self.ids[i[found]]
+        if self.added:
+            for j, key in enumerate(keys):
+                col = self.added.get(key)
+                if col is not None:
+                    cols[j] = col
+        return cols
+
+
+class Titles:
+    # Названия в нижнем регистре и поиск позиций полного совпадения. Хранится
+    # исходная колонка (в артефакте — Arrow поверх mmap / shared memory) и массив
+    # хэшей, а не список и dict строк; дописанные названия — в небольшом dict поверх
+    def __init__(self, titles, hashes=None):
+        # Series индексируется по меткам, для поиска нужен позиционный доступ
+        self.values = getattr(titles, 'array', titles)
+        self.hashes = string_hashes([str(title).lower() for title in self.values]) if hashes is None else hashes
+        self.appended = []
+        self.extra = {}
+
+    def state(self):
+        return np.concatenate([self.hashes, string_hashes(self.appended)]) if self.appended else self.hashes
+
+    def __len__(self):
+        return len(self.hashes) + len(self.appended)
+
+    def __iter__(self):
+        for title in self.values:
+            yield str(title).lower()
+        yield from self.appended
+
+    def append(self, titles):
+        for i, title in enumerate((str(title).lower() for title in titles), len(self)):
+            self.appended.append(title)
+            self.extra.setdefault(title, []).append(i)
+
+    def positions(self, title):
+        # title — уже в нижнем регистре
+        rows = np.flatnonzero(self.hashes == _string_hash(title))
+        extra = self.extra.get(title)
+        return rows if extra is None else np.concatenate([rows, extra])
+
+    def compacted(self, keep):
+        return Titles([title for title, alive in zip(self, keep) if alive])
+
+
+def _pack_postings(postings):
+    # dict токен -> позиции в два массива: все позиции подряд и границы списков
+    tokens = list(postings)
+    offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum([len(postings[token]) for token in tokens], out=offsets[1:])
+    rows = np.concatenate([postings[token] for token in tokens]) if tokens else np.empty(0)
+    return tokens, np.asarray(rows, dtype=np.int32), offsets
+
+
+class TitleIndex:
+    # Режимы: 'ngram' — косинус по символьным n-граммам (одно разреженное
+    # произведение на запрос), 'sequence' — прежний SequenceMatcher для сверки
+    MODES = ('ngram', 'sequence')
+
+    def __init__(self, titles, mode='ngram'):
+        self._set_titles(Titles(titles), mode)
+        self.vocab = Vocabulary()
+        self.matrix = self._build_matrix(self.titles)
+
+    @classmethod
+    def from_state(cls, titles, state, mode='ngram'):
+        # Восстановление из сохранённых массивов (см. artifact.py) без пересчёта
+        # матрицы; массивы могут быть memory-mapped и не копируются
+        index = cls.__new__(cls)
+        index._set_titles(Titles(titles, state.get('hashes')), mode)
+        index.vocab = Vocabulary(state['vocab'], state.get('vocab_hashes'), state.get('vocab_ids'))
+        index.matrix = sp.csr_matrix(
+            (state['data'], state['indices'], state['indptr']),
+            shape=(len(index.titles), len(index.vocab)),
+            copy=False
+        )
+        return index
+
+    def state(self):
+        matrix = self.matrix if self.delta is None else self.rows_matrix(np.arange(len(self.titles)))
+        vocab, vocab_hashes, vocab_ids = self.vocab.state()
+        return {
+            'data': matrix.data,
+            'indices': matrix.indices,
+            'indptr': matrix.indptr,
+            'hashes': self.titles.state(),
+            'vocab': list(vocab),
+            'vocab_hashes': vocab_hashes,
+            'vocab_ids': vocab_ids,
+        }
+
+    def append(self, titles):
+        # Новые названия попадают в небольшую дельта-матрицу; основная матрица
+        # (возможно, memory-mapped) не копируется до compacted()
+        titles = [str(title).lower() for title in titles]
+        rows = self._build_matrix(titles)
+        self.delta = rows if self.delta is None else sp.vstack([self._widen(self.delta), rows], format='csr')
+        self.titles.append(titles)
+
+    def remove(self, positions):
+        self.removed = np.union1d(self.removed, np.asarray(positions, dtype=np.int64))
+
+    def compacted(self, keep):
+        # Новый индекс только по живым строкам (keep — булева маска позиций);
+        # словарь n-грамм сохраняется, поэтому матрицу не нужно пересчитывать
+        index = self.__class__.__new__(self.__class__)
+        index._set_titles(self.titles.compacted(keep), self.mode)
+        index.vocab = self.vocab.copy()
+        index.matrix = self.rows_matrix(np.flatnonzero(keep))
+        return index
+
+    def _widen(self, matrix):
+        # Та же матрица, но с числом столбцов по текущему словарю (после append он растёт)
+        if matrix.shape[1] == len(self.vocab):
+            return matrix
+        return sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], len(self.vocab)))
+
+    def rows_matrix(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.delta is None:
+            return self._widen(self.matrix[rows])
+        base = self.matrix.shape[0]
+        inner = rows < base
+        parts = sp.vstack([
+            self._widen(self.matrix[rows[inner]]),
+            self._widen(self.delta[rows[~inner] - base]),
+        ], format='csr')
+        order = np.argsort(np.concatenate([np.flatnonzero(inner), np.flatnonzero(~inner)]), kind='stable')
+        return parts[order]
+
+    def _set_titles(self, titles, mode):
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный режим сравнения названий: {mode}")
+        self.mode = mode
+        self.titles = titles
+        # Дописанные строки (append) и удалённые позиции до ближайшего compacted()
+        self.delta = None
+        self.removed = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _build_matrix(self, titles):
+        indptr = [0]
+        indices = []
+        data = []
+        for title in titles:
+            grams = {}
+            for gram in char_ngrams(title):
+                col = self.vocab.setdefault(gram, len(self.vocab))
+                grams[col] = grams.get(col, 0) + 1
+            indices.extend(grams.keys())
+            data.extend(grams.values())
+            indptr.append(len(indices))
+
+        matrix = sp.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(titles), len(self.vocab))
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms).dot(matrix), dtype=np.float32)
+
+    def query_vector(self, query):
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        grams = char_ngrams(query)
+        cols = self.vocab.columns(grams)
+        np.add.at(vector, cols[cols >= 0], 1)
+        # Норма считается по всем n-граммам запроса, включая отсутствующие в каталоге
+        counts = {}
+        for gram in grams:
+            counts[gram] = counts.get(gram, 0) + 1
+        norm = np.sqrt(sum(c * c for c in counts.values()))
+        return vector / norm if norm else vector
+
+    def scores(self, query, mode=None):
+        mode = mode or self.mode
+        query = query.lower()
+        if mode == 'sequence':
+            return np.fromiter(
+                (SequenceMatcher(None, query, title).ratio() for title in self.titles),
+                dtype=np.float64, count=len(self.titles)
+            )
+        vector = self.query_vector(query)
+        scores = self.matrix.dot(vector[:self.matrix.shape[1]])
+        if self.delta is not None:
+            scores = np.concatenate([scores, self.delta.dot(vector[:self.delta.shape[1]])])
+        return scores.astype(np.float64)
+
+    def profile_scores(self, rows):
+        # Косинус с суммой векторов нескольких названий: один профиль — одно
+        # произведение матрицы на вектор вместо прохода по каталогу на каждое название
+        profile = np.asarray(self.rows_matrix(rows).sum(axis=0), dtype=np.float32).ravel()
+        norm = np.linalg.norm(profile)
+        if norm:
+            profile /= norm
+        scores = self.matrix.dot(profile[:self.matrix.shape[1]])
+        if self.delta is not None:
+            scores = np.concatenate([scores, self.delta.dot(profile[:self.delta.shape[1]])])
+        return scores.astype(np.float64)
+
+    def search(self, query, tiebreak, n, mode=None, mask=None):
+        # Полное совпадение с запросом (похожесть 1.0) в выдачу не попадает;
+        # mask — булева маска допустимых строк (filters.FilterIndex)
+        with span("title.score"):
+            scores = self.scores(query, mode)
+            scores[self.titles.positions(query.lower())] = -np.inf
+            scores[self.removed] = -np.inf
+            if mask is not None:
+                scores[~mask] = -np.inf
+        with span("title.select"):
+            positions = top_n(scores, tiebreak, n)
+        return positions, scores[positions]
+
+    def search_many(self, queries, tiebreak, n, mask=None):
+        # Пачка запросов — одно произведение разреженной матрицы на матрицу запросов
+        with span("title.score", batch=len(queries)):
+            vectors = np.stack([self.query_vector(query.lower()) for query in queries], axis=1)
+            scores = self.matrix.dot(vectors[:self.matrix.shape[1]])
+            if self.delta is not None:
+                scores = np.vstack([scores, self.delta.dot(vectors[:self.delta.shape[1]])])
+        results = []
+        with span("title.select", batch=len(queries)):
+            for j, query in enumerate(queries):
+                column = scores[:, j].astype(np.float64)
+                column[self.titles.positions(query.lower())] = -np.inf
+                column[self.removed] = -np.inf
+                if mask is not None:
+                    column[~mask] = -np.inf
+                positions = top_n(column, tiebreak, n)
+                results.append((positions, column[positions]))
+        return results
+
+    def agreement(self, query, tiebreak, n):
+        # Доля общих книг в top-N режима 'ngram' и эталонного 'sequence'
+        fast, _ = self.search(query, tiebreak, n, mode='ngram')
+        reference, _ = self.search(query, tiebreak, n, mode='sequence')
+        if len(reference) == 0:
+            return 1.0
+        return len(set(fast.tolist()) & set(reference.tolist())) / len(reference)
+
+
+class TokenIndex:
+    # BM25 по словам названия (clean_title) и отдельному полю серии из скобок.
+    # Хранится матрица частот слов; веса BM25 считаются по ней один раз (или берутся
+    # из артефакта) и лежат по столбцам, поэтому запрос — сумма нескольких столбцов своих слов
+    K1 = 1.2
+    B = 0.75
+    SERIES_WEIGHT = 0.5
+
+    def __init__(self, titles, series, numbers):
+        self.vocab = Vocabulary()
+        self._set_titles(Titles(titles))
+        self.counts = self._build_counts(self.titles, series, numbers)
+
+    @classmethod
+    def from_state(cls, titles, state):
+        index = cls.__new__(cls)
+        index._set_titles(Titles(titles, state.get('hashes')))
+        index.vocab = Vocabulary(state['vocab'], state.get('vocab_hashes'), state.get('vocab_ids'))
+        index.counts = sp.csr_matrix(
+            (state['data'], state['indices'], state['indptr']),
+            shape=(len(index.titles), len(index.vocab)),
+            copy=False
+        )
+        if 'weights_data' in state:
+            # Веса BM25, посчитанные при сборке артефакта, общие для процессов;
+            # после append/remove они пересчитываются уже в своей памяти
+            index._weights = sp.csc_matrix(
+                (state['weights_data'], state['weights_indices'], state['weights_indptr']),
+                shape=index.counts.shape,
+                copy=False
+            )
+            index._idf = state['idf']
+        return index
+
+    def state(self):
+        counts = self._widen(self.counts)
+        weights = self.weights
+        vocab, vocab_hashes, vocab_ids = self.vocab.state()
+        return {
+            'data': counts.data, 'indices': counts.indices, 'indptr': counts.indptr,
+            'weights_data': weights.data, 'weights_indices': weights.indices, 'weights_indptr': weights.indptr,
+            'idf': self._idf,
+            'hashes': self.titles.state(),
+            'vocab': list(vocab), 'vocab_hashes': vocab_hashes, 'vocab_ids': vocab_ids,
+        }
+
+    def _set_titles(self, titles):
+        self.titles = titles
+        self.removed = np.empty(0, dtype=np.int64)
+        self._weights = None
+        self._idf = None
+
+    def append(self, titles, series, numbers):
+        # Частоты новых строк дописываются к матрице, веса BM25 пересчитываются
+        # при следующем запросе (idf и средняя длина зависят от всего каталога)
+        titles = [str(title).lower() for title in titles]
+        rows = self._build_counts(titles, series, numbers)
+        self.counts = sp.vstack([self._widen(self.counts), rows], format='csr')
+        self.titles.append(titles)
+        self._weights = None
+
+    def remove(self, positions):
+        # Удалённые строки не входят в idf и среднюю длину, поэтому веса пересчитываются
+        self.removed = np.union1d(self.removed, np.asarray(positions, dtype=np.int64))
+        self._weights = None
+
+    def compacted(self, keep):
+        index = self.__class__.__new__(self.__class__)
+        index._set_titles(self.titles.compacted(keep))
+        index.vocab = self.vocab.copy()
+        index.counts = self._widen(self.counts)[np.flatnonzero(keep)]
+        return index
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _widen(self, matrix):
+        if matrix.shape[1] == len(self.vocab):
+            return matrix
+        return sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], len(self.vocab)))
+
+    def _build_counts(self, titles, series, numbers):
+        indptr = [0]
+        indices = []
+        data = []
+        for title, name, number in zip(titles, series, numbers):
+            counts = {}
+            for token in title_tokens(title) + series_tokens(name, number):
+                col = self.vocab.setdefault(token, len(self.vocab))
+                counts[col] = counts.get(col, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return sp.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.vocab))
+        )
+
+    @property
+    def weights(self):
+        if self._weights is None:
+            with span("tokens.weights"):
+                self._weights, self._idf = self._bm25()
+        return self._weights
+
+    def _bm25(self):
+        # Длина документа и средняя длина считаются отдельно для названия и серии
+        counts = self._widen(self.counts)
+        n_rows = counts.shape[0]
+        rows = np.repeat(np.arange(n_rows), np.diff(counts.indptr))
+        is_series = np.fromiter((token.startswith(SERIES_PREFIX) for token in self.vocab), dtype=bool, count=len(self.vocab))
+        field = is_series[counts.indices].astype(np.int64)
+        lengths = np.bincount(rows * 2 + field, weights=counts.data, minlength=2 * n_rows).reshape(n_rows, 2)
+        # Статистика каталога — только по живым строкам, как после compact()
+        alive = np.ones(n_rows, dtype=bool)
+        alive[self.removed] = False
+        average = np.array([
+            lengths[alive & (lengths[:, f] > 0), f].mean() if (alive & (lengths[:, f] > 0)).any() else 1.0
+            for f in (0, 1)
+        ])
+
+        df = np.bincount(counts.indices[alive[rows]], minlength=len(self.vocab))
+        idf = np.log1p((alive.sum() - df + 0.5) / (df + 0.5))
+        tf = counts.data.astype(np.float64)
+        norm = self.K1 * (1 - self.B + self.B * lengths[rows, field] / average[field])
+        data = idf[counts.indices] * tf * (self.K1 + 1) / (tf + norm)
+        data[field == 1] *= self.SERIES_WEIGHT
+        return sp.csc_matrix(sp.csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)), idf
+
+    def scores(self, query):
+        # Каждое слово запроса ищется и в названии, и в поле серии. Сумма делится на
+        # предел BM25 для этих слов (idf * (k1 + 1)), чтобы похожесть была в [0, 1]
+        weights = self.weights
+        scores = np.zeros(weights.shape[0], dtype=np.float64)
+        bound = 0.0
+        tokens = title_tokens(query)
+        keys = [(key, field_weight) for token in set(tokens)
+                for key, field_weight in ((token, 1.0), (SERIES_PREFIX + token, self.SERIES_WEIGHT))]
+        keys += [(key, self.SERIES_WEIGHT) for key in _volume_keys(tokens, self.vocab)]
+        for key, field_weight in keys:
+            col = self.vocab.get(key)
+            if col is None:
+                continue
+            start, end = weights.indptr[col], weights.indptr[col + 1]
+            scores[weights.indices[start:end]] += weights.data[start:end]
+            bound += self._idf[col] * (self.K1 + 1) * field_weight
+        return scores / bound if bound else scores
+
+    def search(self, query, tiebreak, n, mask=None):
+        # В выдачу попадают только книги хотя бы с одним общим словом; сама книга
+        # запроса (то же название без скобок) исключается, как и в TitleIndex
+        with span("tokens.score"):
+            scores = self.scores(query)
+            scores[scores <= 0] = -np.inf
+            clean = re.sub(r'\(.*\)', '', query).strip().lower()
+            scores[self.titles.positions(clean)] = -np.inf
+            scores[self.removed] = -np.inf
+            if mask is not None:
+                scores[~mask] = -np.inf
+        with span("tokens.select"):
+            positions = top_n(scores, tiebreak, n)
+        return positions, scores[positions]
+
+
+class AuthorIndex:
+    # Инвертированный индекс токен автора -> позиции книг. Жаккар считается
+    # только по книгам, у которых есть хотя бы один общий токен с запросом.
+    # Списки позиций лежат подряд в одном массиве rows (границы — offsets, по
+    # номеру токена в vocab); позиции, дописанные append, — в extra
+    def __init__(self, authors):
+        postings = defaultdict(list)
+        sizes = []
+        for i, value in enumerate(authors):
+            tokens = author_tokens(str(value))
+            sizes.append(len(tokens))
+            for token in tokens:
+                postings[token].append(i)
+
+        tokens, rows, offsets = _pack_postings(postings)
+        self._set_postings(Vocabulary(tokens), rows, offsets, np.asarray(sizes, dtype=np.int32))
+
+    @classmethod
+    def from_state(cls, state):
+        # Массивы могут быть memory-mapped и не копируются
+        index = cls.__new__(cls)
+        vocab = Vocabulary(state['tokens'], state.get('token_hashes'), state.get('token_ids'))
+        index._set_postings(vocab, state['rows'], state['offsets'], state['sizes'])
+        return index
+
+    def _set_postings(self, vocab, rows, offsets, sizes):
+        self.vocab = vocab
+        self.rows = rows
+        self.offsets = offsets
+        self.sizes = sizes
+        self.extra = {}
+        self.removed = np.empty(0, dtype=np.int64)
+
+    def postings(self, col):
+        rows = self.rows[self.offsets[col]:self.offsets[col + 1]] if col < len(self.offsets) - 1 else None
+        extra = self.extra.get(col)
+        if extra is None:
+            return rows
+        return extra if rows is None else np.concatenate([rows, extra])
+
+    def state(self):
+        tokens, rows, offsets = _pack_postings({token: self.postings(col) for col, token in enumerate(self.vocab)})
+        tokens, token_hashes, token_ids = Vocabulary(tokens).state()
+        return {
+            'tokens': tokens, 'token_hashes': token_hashes, 'token_ids': token_ids,
+            'rows': rows, 'offsets': offsets, 'sizes': self.sizes,
+        }
+
+    def append(self, authors):
+        # Новые позиции дописываются в extra затронутых токенов
+        start = len(self.sizes)
+        postings = defaultdict(list)
+        sizes = []
+        for i, value in enumerate(authors, start):
+            tokens = author_tokens(str(value))
+            sizes.append(len(tokens))
+            for token in tokens:
+                postings[token].append(i)
+
+        for token, rows in postings.items():
+            col = self.vocab.setdefault(token, len(self.vocab))
+            existing = self.extra.get(col)
+            rows = np.asarray(rows, dtype=np.int32)
+            self.extra[col] = rows if existing is None else np.concatenate([existing, rows])
+        self.sizes = np.concatenate([self.sizes, np.asarray(sizes, dtype=np.int32)])
+
+    def remove(self, positions):
+        self.removed = np.union1d(self.removed, np.asarray(positions, dtype=np.int64))
+
+    def compacted(self, keep):
+        # Перенумерация позиций без повторной токенизации авторов
+        remap = np.cumsum(keep) - 1
+        postings = {}
+        for col, token in enumerate(self.vocab):
+            rows = self.postings(col)
+            rows = rows[keep[rows]]
+            if len(rows):
+                postings[token] = remap[rows]
+        tokens, rows, offsets = _pack_postings(postings)
+        index = self.__class__.__new__(self.__class__)
+        index._set_postings(Vocabulary(tokens), rows, offsets, np.asarray(self.sizes)[keep])
+        return index
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def candidates(self, query):
+        tokens = author_tokens(query)
+        cols = [self.vocab.get(token) for token in tokens]
+        lists = [self.postings(col) for col in cols if col is not None]
+        if not lists:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        rows, intersection = np.unique(np.concatenate(lists), return_counts=True)
+        if len(self.removed):
+            alive = ~np.isin(rows, self.removed)
+            rows, intersection = rows[alive], intersection[alive]
+        union = len(tokens) + self.sizes[rows] - intersection
+        return rows, intersection / union
+
+    def search(self, query, tiebreak, n, fallback_order, mask=None):
+        # fallback_order — все позиции по убыванию tiebreak (стабильно). Им
+        # добиваются книги с нулевой похожестью, если совпадений меньше n
+        with span("author.score"):
+            rows, scores = self.candidates(query)
+            if mask is not None:
+                allowed = mask[rows]
+                rows, scores = rows[allowed], scores[allowed]
+                fallback_order = fallback_order[mask[fallback_order]]
+        with span("author.select"):
+            local = top_n(scores, tiebreak[rows], n)
+            positions = rows[local]
+            scores = scores[local]
+
+            missing = n - len(positions)
+            if missing > 0:
+                head = fallback_order[:missing + len(rows)]
+                extra = head[~np.isin(head, rows)][:missing]
+                positions = np.concatenate([positions, extra])
+                scores = np.concatenate([scores, np.zeros(len(extra))])
+        return positions, scores
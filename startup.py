@@ -0,0 +1,64 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Отчёт о холодном старте: время импорта модулей приложения в свежем процессе
+# по данным `python -X importtime`, с разбивкой по пакетам верхнего уровня:
+#   python startup.py BookRecommender recommender
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Библиотеки визуализации: нужны только вкладке аналитики (базовый plotly
+# импортирует сам streamlit, тяжёлый plotly.express — только график)
+HEAVY = ('plotly.express', 'seaborn', 'matplotlib', 'wordcloud')
+
+
+def import_times(module, top=12):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=ROOT,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Строки вида "import time: self [us] | cumulative | name"; собственное время
+    # каждого модуля относится к его пакету верхнего уровня, без двойного счёта
+    packages = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|", 2)
+        if not own.strip().isdigit():
+            continue
+        name = name.strip()
+        loaded.add(name)
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + int(own) / 1000
+
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return {
+        'module': module,
+        'import_ms': round(sum(packages.values()), 1),
+        'process_ms': round(wall_ms, 1),
+        'packages': [(name, round(ms, 1)) for name, ms in ranked[:top]],
+        'heavy_loaded': [name for name in HEAVY if name in loaded],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Время импорта модулей в свежем процессе")
+    parser.add_argument("modules", nargs="*", default=["BookRecommender", "recommender"])
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        report = import_times(module, args.top)
+        heavy = ", ".join(report['heavy_loaded']) or "нет"
+        print(f"import {module}: {report['import_ms']} мс импортов, {report['process_ms']} мс с запуском "
+              f"интерпретатора; библиотеки визуализации: {heavy}")
+        for name, ms in report['packages']:
+            print(f"  {name:<24} {ms:>8.1f} мс")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# Модули проекта лежат в корне репозитория
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BOOKS_CSV = os.path.join(ROOT, "books.csv")
+
+
+@pytest.fixture(scope="session")
+def books_csv():
+    return BOOKS_CSV
+
+
+@pytest.fixture(scope="session")
+def csv_lines():
+    # Строки books.csv как есть (без перевода строки), строка 0 — заголовок
+    with open(BOOKS_CSV, encoding="utf-8") as f:
+        return f.read().splitlines()
@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pytest
+
+from artifact import load_artifact
+from loader import read_catalog
+from recommender import BookRecommender
+
+# Веса BM25 и позиции строк по bookID / названию / автору читаются из артефакта,
+# а не строятся в каждом процессе; выдача при этом та же, что у сборки по CSV
+
+QUERIES = 30
+
+
+@pytest.fixture(scope="module")
+def artifact(books_csv, tmp_path_factory):
+    return load_artifact(books_csv, str(tmp_path_factory.mktemp("artifact") / "artifacts"))
+
+
+@pytest.fixture(scope="module")
+def rebuilt(books_csv):
+    return BookRecommender(read_catalog(books_csv))
+
+
+def test_weights_come_from_artifact(artifact, rebuilt):
+    weights = artifact.token_index._weights
+    assert weights is not None
+    assert np.array_equal(weights.indptr, rebuilt.token_index.weights.indptr)
+    assert np.allclose(weights.data, rebuilt.token_index.weights.data)
+
+
+def test_recommend_matches_csv(artifact, rebuilt):
+    recommender = BookRecommender.from_artifact(artifact, neighbours=False)
+    rnd = random.Random(0)
+    titles = rnd.sample(recommender.df['title'].tolist(), QUERIES)
+    queries = {
+        'title': titles,
+        'author': rnd.sample(recommender.df['authors'].tolist(), QUERIES),
+        'tokens': [title.lower() for title in titles],
+        'hybrid': titles,
+    }
+    for by, values in queries.items():
+        for query in values:
+            assert list(recommender.recommend(query, by, 10).columns['bookID']) \
+                == list(rebuilt.recommend(query, by, 10).columns['bookID'])
+
+    book_ids = rnd.sample(recommender.df['bookID'].tolist(), 5)
+    assert list(recommender.recommend_for_history(book_ids, n=10).columns['bookID']) \
+        == list(rebuilt.recommend_for_history(book_ids, n=10).columns['bookID'])
+    assert recommender.book_titles(book_ids + [-1]) == rebuilt.book_titles(book_ids + [-1])
+
+
+def test_lookups_follow_catalog_changes(artifact):
+    recommender = BookRecommender.from_artifact(artifact, neighbours=False)
+    df = recommender.df
+    title = df['title'].value_counts().index[0]
+    first, second = np.flatnonzero(df['title'].to_numpy() == title)[:2]
+    assert recommender.find_book(title) == df['bookID'].iat[first]
+
+    # Удалённая книга пропускается, находится следующая с тем же названием
+    recommender.remove_books([df['bookID'].iat[first]])
+    assert recommender.find_book(title) == df['bookID'].iat[second]
+    assert recommender.remove_books([df['bookID'].iat[first]]).empty
+
+    # Дописанная книга находится по bookID и названию до compact() и после
+    added = df.iloc[[first]].drop(columns=['clean_title', 'series', 'series_number', 'work_id', 'work_block'])
+    added = added.assign(bookID=int(df['bookID'].max()) + 1, title="Completely New Title")
+    recommender.add_books(added)
+    book_id = int(added['bookID'].iat[0])
+    assert recommender.find_book("Completely New Title") == book_id
+    assert recommender.book_titles([book_id]) == {book_id: "Completely New Title"}
+
+    recommender.compact()
+    assert recommender.find_book("Completely New Title") == book_id
+    assert recommender.find_book(title) == recommender.df['bookID'].iat[
+        np.flatnonzero(recommender.df['title'].to_numpy() == title)[0]]
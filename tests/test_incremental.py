@@ -0,0 +1,153 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from live_catalog import CatalogWatcher, LiveCatalog
+from loader import read_catalog
+from recommender import BookRecommender
+
+# Правки каталога (add/update/remove_books, compact) должны давать ту же выдачу,
+# что и BookRecommender, собранный заново по тем же книгам
+
+ROWS = 200
+QUERIES = 30
+
+
+@pytest.fixture(scope="module")
+def catalog(books_csv):
+    return read_catalog(books_csv)
+
+
+@pytest.fixture
+def recommender(catalog):
+    return BookRecommender(catalog.copy())
+
+
+def appended_rows(catalog, count, seed=0):
+    # Новые книги: строки каталога с новыми bookID и изменёнными названиями
+    rng = np.random.default_rng(seed)
+    rows = catalog.iloc[rng.choice(len(catalog), size=count, replace=False)].reset_index(drop=True)
+    rows = rows.drop(columns=['clean_title', 'series', 'series_number', 'work_id', 'work_block'], errors='ignore')
+    rows['bookID'] = int(catalog['bookID'].max()) + 1 + np.arange(count)
+    rows['title'] = rows['title'].astype(str) + " Revisited"
+    return rows
+
+
+def queries_for(rows, seed=0):
+    rnd = random.Random(seed)
+    titles = rows['title'].head(QUERIES).tolist()
+    return {
+        'title': titles,
+        'author': [rnd.choice(rows['authors'].tolist()) for _ in range(QUERIES)],
+        'tokens': [title.lower() for title in titles],
+    }
+
+
+def warm(recommender, queries):
+    # Выдача до правки попадает в кэш: после правки её там быть не должно
+    for by, values in queries.items():
+        for query in values:
+            recommender.recommend(query, by, 10)
+
+
+def assert_matches_rebuild(recommender, queries, n=10):
+    rebuilt = BookRecommender(recommender.books())
+    mismatches = [
+        (by, query)
+        for by, values in queries.items() for query in values
+        if list(recommender.recommend(query, by, n).columns['bookID'])
+        != list(rebuilt.recommend(query, by, n).columns['bookID'])
+    ]
+    assert mismatches == []
+
+
+def test_add_books(recommender, catalog):
+    added = appended_rows(catalog, ROWS)
+    queries = queries_for(added)
+    warm(recommender, queries)
+
+    recommender.add_books(added)
+    assert len(recommender.books()) == len(catalog) + ROWS
+    assert_matches_rebuild(recommender, queries)
+
+
+def test_add_books_empty(recommender):
+    revision = recommender.revision
+    assert recommender.add_books([]).empty
+    assert recommender.add_books(pd.DataFrame()).empty
+    assert recommender.revision == revision
+
+
+def test_update_books(recommender, catalog):
+    rows = appended_rows(catalog, ROWS, seed=1)
+    rows['bookID'] = catalog['bookID'].sample(ROWS, random_state=1).to_numpy()
+    queries = queries_for(rows, seed=1)
+    warm(recommender, queries)
+
+    added, removed = recommender.update_books(rows)
+    assert len(added) == len(removed) == ROWS
+    assert len(recommender.books()) == len(catalog)
+    assert_matches_rebuild(recommender, queries)
+
+
+def test_remove_books(recommender, catalog):
+    queries = queries_for(catalog.sample(QUERIES, random_state=2), seed=2)
+    warm(recommender, queries)
+
+    removed = random.Random(2).sample(catalog['bookID'].tolist(), ROWS)
+    recommender.remove_books(removed)
+    books = recommender.books()
+    assert len(books) == len(catalog) - ROWS
+    assert not books['bookID'].isin(removed).any()
+    assert_matches_rebuild(recommender, queries)
+
+
+def test_compact(recommender, catalog):
+    added = appended_rows(catalog, ROWS, seed=3)
+    queries = queries_for(added, seed=3)
+    recommender.add_books(added)
+    recommender.remove_books(random.Random(3).sample(recommender.df['bookID'].tolist(), ROWS))
+    warm(recommender, queries)
+
+    assert recommender.compact()
+    assert recommender.pending_compaction() == 0
+    assert_matches_rebuild(recommender, queries)
+
+
+def test_ann_after_add_books(recommender, catalog):
+    # IVF, включённый после add_books, видит дописанные строки: при просмотре
+    # всех кластеров его выдача совпадает с точным поиском
+    added = appended_rows(catalog, ROWS, seed=4)
+    recommender.add_books(added)
+    ann = recommender.enable_ann()
+
+    assert len(ann.labels) == len(recommender.df)
+    assert 0 <= ann.labels.min() and ann.labels.max() < ann.n_lists
+    for query in added['title'].head(QUERIES):
+        exact, _ = recommender.title_index.search(query, recommender.ratings, 10)
+        approximate, _ = ann.search(query, recommender.ratings, 10, n_probe=ann.n_lists)
+        assert approximate.tolist() == exact.tolist()
+
+
+def test_watcher_skips_malformed_first_appended_line(tmp_path, csv_lines):
+    csv_path = tmp_path / "books.csv"
+    csv_path.write_text("\n".join(csv_lines[:301]) + "\n", encoding="utf-8")
+    live = LiveCatalog(str(csv_path), directory=str(tmp_path / "artifacts"))
+    watcher = CatalogWatcher(live)
+
+    malformed, first, second = csv_lines[400:403]
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("\n".join([malformed + ",extra", first, second]) + "\n")
+    frame = watcher.poll()
+
+    expected = [int(line.split(',')[0]) for line in (first, second)]
+    assert frame['bookID'].tolist() == expected
+    assert frame['authors'].tolist() == [line.split(',')[2] for line in (first, second)]
+    assert [line for line, _ in watcher.report.skipped_lines] == [302]
+
+    books = live.books()
+    assert len(books) == 302
+    assert books['bookID'].tail(2).tolist() == expected
+    assert not (books['bookID'] == 0).any()
@@ -0,0 +1,45 @@
+import io
+
+from loader import LoadReport, read_catalog
+
+
+def _read(lines, chunksize=2):
+    report = LoadReport()
+    data = read_catalog(io.BytesIO(("\n".join(lines) + "\n").encode("utf-8")), chunksize=chunksize, report=report)
+    return data, report
+
+
+def test_extra_field_in_first_row_is_skipped(csv_lines):
+    header, first, second, third = csv_lines[:4]
+    data, report = _read([header, first + ",extra", second, third])
+
+    assert data['bookID'].tolist() == [int(second.split(',')[0]), int(third.split(',')[0])]
+    assert data['authors'].tolist()[0] == second.split(',')[2]
+    assert [line for line, _ in report.skipped_lines] == [2]
+
+
+def test_extra_fields_after_first_row_stay_skipped(csv_lines):
+    header, first, second, third = csv_lines[:4]
+    data, report = _read([header, first + ",extra", second + ",extra", third])
+
+    assert data['bookID'].tolist() == [int(third.split(',')[0])]
+    assert [line for line, _ in report.skipped_lines] == [2, 3]
+
+
+def test_unparsable_book_id_is_dropped(csv_lines):
+    header, first, second = csv_lines[:3]
+    broken = "abc" + first[first.index(','):]
+    data, report = _read([header, broken, second])
+
+    assert data['bookID'].tolist() == [int(second.split(',')[0])]
+    assert report.invalid_ids == ["abc"]
+    assert report.dropped_rows == 1
+
+
+def test_books_csv_reports_known_bad_lines(books_csv):
+    report = LoadReport()
+    data = read_catalog(books_csv, report=report)
+
+    assert len(data) == report.rows
+    assert [line for line, _ in report.skipped_lines] == [3350, 4704, 5879, 8981]
+    assert (data['bookID'] > 0).all()
@@ -0,0 +1,109 @@
+import re
+from bisect import bisect_left
+
+import numpy as np
+
+from instrumentation import span
+from similarity import TitleIndex, top_n
+
+# Подсказки при вводе названия или автора: отсортированный массив префиксов
+# (начало строки и начало каждого слова) и нечёткий поиск по триграммам,
+# если по префиксу нашлось меньше limit вариантов
+
+_WORD = re.compile(r"\w+")
+SHORT_PREFIX = 2
+
+
+def _normalize(text):
+    return " ".join(_WORD.findall(str(text).lower()))
+
+
+class SearchIndex:
+    def __init__(self, values, popularity=None, min_similarity=0.25):
+        # values — строки каталога (с повторами), popularity — вес каждой строки;
+        # варианты одной строки объединяются, их вес суммируется
+        values = list(values)
+        popularity = np.ones(len(values)) if popularity is None else np.asarray(popularity, dtype=np.float64)
+        self.min_similarity = min_similarity
+        self._short = {}
+        self.values, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        self.popularity = np.bincount(inverse.ravel(), weights=popularity, minlength=len(self.values))
+
+        keys = []
+        for i, value in enumerate(self.values):
+            text = _normalize(value)
+            for match in _WORD.finditer(text):
+                keys.append((text[match.start():], i))
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.ids = np.fromiter((i for _, i in keys), dtype=np.int32, count=len(keys))
+
+        # Триграммы по столбцам: запрос затрагивает только списки своих триграмм
+        self.fuzzy = TitleIndex(self.values)
+        self.columns = self.fuzzy.matrix.tocsc()
+
+    def __len__(self):
+        return len(self.values)
+
+    def prefix(self, query, limit=10):
+        query = _normalize(query)
+        # Короткие префиксы покрывают большую часть каталога — их ответы запоминаются
+        short = len(query) <= SHORT_PREFIX
+        if short and (query, limit) in self._short:
+            return self._short[query, limit]
+        if not query:
+            ids = np.arange(len(self.values))
+        else:
+            lo = bisect_left(self.keys, query)
+            hi = bisect_left(self.keys, query + "\uffff")
+            ids = np.unique(self.ids[lo:hi])
+        found = ids[top_n(self.popularity[ids], -ids.astype(np.float64), limit)]
+        if short:
+            self._short[query, limit] = found
+        return found
+
+    def search(self, query, limit=10):
+        # Сначала совпадения по префиксу (по убыванию популярности), затем похожие по триграммам
+        with span("typeahead", limit=limit):
+            found = self.prefix(query, limit)
+            if len(found) < limit and _normalize(query):
+                vector = self.fuzzy.query_vector(query)
+                grams = np.flatnonzero(vector)
+                scores = np.asarray(self.columns[:, grams].dot(vector[grams]), dtype=np.float64)
+                scores[scores < self.min_similarity] = -np.inf
+                scores[found] = -np.inf
+                found = np.concatenate([found, top_n(scores, self.popularity, limit - len(found))])
+            return self.values[found].tolist()
+
+
+def build_search_indexes(books):
+    # Индексы для боковой панели: популярность строки — сумма ratings_count её книг
+    with span("typeahead.build"):
+        popularity = books['ratings_count'].to_numpy(dtype=np.float64)
+        return {
+            'title': SearchIndex(books['title'], popularity),
+            'authors': SearchIndex(books['authors'], popularity),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from artifact import DEFAULT_CSV
+    from loader import read_catalog
+
+    parser = argparse.ArgumentParser(description="Подсказки по названиям и авторам")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--by", choices=["title", "authors"], default="title")
+    parser.add_argument("-n", type=int, default=10)
+    args = parser.parse_args()
+
+    index = build_search_indexes(read_catalog(args.csv))[args.by]
+    for query in args.queries:
+        started = time.perf_counter()
+        found = index.search(query, args.n)
+        print(f"{query!r}: {(time.perf_counter() - started) * 1000:.3f} мс")
+        for value in found:
+            print(f"  {value}")
@@ -0,0 +1,154 @@
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# Издания одного произведения (разные ISBN, издатели, переводчики) склеиваются в
+# work_id. Блок — хэш нормализованного clean_title и номера в серии; внутри блока
+# издания объединяются, если у них есть общий автор. Сравниваются только строки
+# одного блока, поэтому проход линейный, а не попарный по всему каталогу
+
+WORK_COLUMNS = ('work_id', 'work_block')
+_WORD = re.compile(r"\w+")
+
+
+def _block_key(title, number):
+    words = " ".join(_WORD.findall(str(title).lower()))
+    number = "" if number is None or number != number else f"{float(number):g}"
+    digest = hashlib.blake2b(f"{words}#{number}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def _author_keys(authors):
+    # "J.R.R. Tolkien" и "J. R. R. Tolkien" дают один ключ
+    keys = (re.sub(r"\W+", "", author.lower()) for author in str(authors).split('/'))
+    return {key for key in keys if key}
+
+
+def work_blocks(clean_titles, series_numbers):
+    return np.fromiter(
+        (_block_key(title, number) for title, number in zip(clean_titles, series_numbers)),
+        dtype=np.int64, count=len(clean_titles)
+    )
+
+
+def cluster_works(data):
+    # work_id (по порядку первого издания) и ключ блока для каждой строки каталога
+    with span("works.cluster"):
+        blocks = work_blocks(data['clean_title'], data['series_number'])
+        authors = data['authors'].tolist()
+        parent = np.arange(len(blocks))
+
+        order = np.argsort(blocks, kind='stable')
+        starts = np.flatnonzero(np.r_[True, blocks[order][1:] != blocks[order][:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            # Корень группы — самая ранняя строка, поэтому id идут по первому изданию
+            owner = {}
+            for row in order[start:end]:
+                roots = {_find(parent, owner[key]) for key in _author_keys(authors[row]) if key in owner}
+                root = min(roots | {row})
+                for other in roots:
+                    parent[other] = root
+                parent[row] = root
+                for key in _author_keys(authors[row]):
+                    owner.setdefault(key, row)
+
+        roots = np.array([_find(parent, row) for row in range(len(parent))], dtype=np.int64)
+        _, work_ids = np.unique(roots, return_inverse=True)
+        return work_ids.astype(np.int32), blocks
+
+
+def _find(parent, row):
+    while parent[row] != row:
+        parent[row] = parent[parent[row]]
+        row = parent[row]
+    return row
+
+
+def assign_works(catalog, frame):
+    # work_id для дописываемых книг: существующее произведение из того же блока
+    # с общим автором или новый id
+    blocks = work_blocks(frame['clean_title'], frame['series_number'])
+    known_blocks = catalog['work_block'].to_numpy()
+    known_works = catalog['work_id'].to_numpy()
+    next_id = int(known_works.max()) + 1 if len(known_works) else 0
+    # Строки каталога из блоков новых книг — один проход по столбцу на вызов,
+    # а не сравнение всего work_block на каждую дописываемую строку
+    known_rows = {}
+    for row in np.flatnonzero(np.isin(known_blocks, blocks)):
+        known_rows.setdefault(int(known_blocks[row]), []).append(row)
+    known_authors = catalog['authors'].array
+    assigned = []
+    new_rows = {}
+    for block, authors in zip(blocks.tolist(), frame['authors']):
+        keys = _author_keys(authors)
+        work_id = None
+        for row in known_rows.get(block, ()):
+            if keys & _author_keys(known_authors[row]):
+                work_id = int(known_works[row])
+                break
+        if work_id is None:
+            for other_keys, other_id in new_rows.get(block, ()):
+                if keys & other_keys:
+                    work_id = other_id
+                    break
+        if work_id is None:
+            work_id = next_id
+            next_id += 1
+        new_rows.setdefault(block, []).append((keys, work_id))
+        assigned.append(work_id)
+    return np.asarray(assigned, dtype=np.int32), blocks
+
+
+class WorkIndex:
+    # Каноническое издание произведения — с наибольшим ratings_count (при равенстве
+    # — первое в каталоге). representatives(mask) выбирает его среди разрешённых строк
+    def __init__(self, work_ids, ratings_count, alive=None):
+        self.work_ids = np.asarray(work_ids)
+        self.rows = len(self.work_ids)
+        ratings_count = np.asarray(ratings_count, dtype=np.int64)
+        order = np.lexsort((-ratings_count, self.work_ids))
+        self.order = order if alive is None else order[np.asarray(alive)[order]]
+        self.canonical = self._first_of_each(self.order)
+
+    @classmethod
+    def from_state(cls, work_ids, state):
+        # Порядок и маска канонических изданий из артефакта, без сортировки
+        index = cls.__new__(cls)
+        index.work_ids = np.asarray(work_ids)
+        index.rows = len(index.work_ids)
+        index.order = state['order']
+        index.canonical = state['canonical']
+        return index
+
+    def state(self):
+        return {'order': self.order, 'canonical': self.canonical}
+
+    def __len__(self):
+        return int(self.canonical.sum())
+
+    def _first_of_each(self, order):
+        mask = np.zeros(self.rows, dtype=bool)
+        if len(order):
+            works = self.work_ids[order]
+            mask[order[np.r_[True, works[1:] != works[:-1]]]] = True
+        mask.flags.writeable = False
+        return mask
+
+    def representatives(self, mask=None):
+        if mask is None:
+            return self.canonical
+        return self._first_of_each(self.order[mask[self.order]])
+
+
+def work_titles(data):
+    # Подпись произведения — название его канонического издания
+    ranked = data.sort_values('ratings_count', ascending=False, kind='stable')
+    first = ranked.drop_duplicates('work_id')
+    return pd.Series(first['title'].to_numpy(), index=first['work_id'].to_numpy())